@@ -1,21 +1,29 @@
 # analyzers/base_analyzer.py
 import logging
-from api_handler import APIHandler
+from api_registry import APIClientRegistry
 from config_manager import ConfigManager
 from file_processor import FileProcessor
+from build_state import BuildState, digest
 import threading
 
 
 class BaseAnalyzer:
-    def __init__(self, config_manager):
+    def __init__(self, config_manager, api_handler=None):
         self.config = config_manager
-        self.api_handler = APIHandler(config_manager)
+        self._api_handler = api_handler
         self.file_processor = FileProcessor
         self.logger = logging.getLogger(self.__class__.__name__)
         self.progress_callback = None
         self.pause_event = None
         self.stop_event = None
 
+    @property
+    def api_handler(self):
+        """注入的客户端优先，否则按当前引擎和密钥从进程级注册表取共享客户端"""
+        if self._api_handler is not None:
+            return self._api_handler
+        return APIClientRegistry.get_client(self.config)
+
     def set_control_events(self, pause_event, stop_event):
         self.pause_event = pause_event
         self.stop_event = stop_event
@@ -40,6 +48,24 @@ class BaseAnalyzer:
     def get_output_dir(self):
         return self.config.get('global', 'output_dir', 'output')
 
+    def get_build_state(self):
+        return BuildState.for_output_dir(self.get_output_dir())
+
+    def config_digest(self, section, exclude=('prompt',)):
+        """对某阶段除提示词外的配置取哈希，作为产物指纹的一部分"""
+        options = {
+            option: self.config.get(section, option, default)
+            for option, default in self.config.defaults.get(section, {}).items()
+            if option not in exclude
+        }
+        return digest(options)
+
+    def get_concurrency(self):
+        try:
+            return max(1, int(self.config.get('global', 'concurrency', '4')))
+        except ValueError:
+            return 1
+
     def get_chapter_range(self, range_str='all'):
         if range_str.lower() == 'all':
             return None
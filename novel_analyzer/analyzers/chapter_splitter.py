@@ -2,12 +2,15 @@
 import os
 import logging
 from .base_analyzer import BaseAnalyzer
+from summary_store import SummaryStore
+from build_state import digest, digest_file
 
 
 class ChapterSplitter(BaseAnalyzer):
     def __init__(self, config_manager):
         super().__init__(config_manager)
         self.logger = logging.getLogger(__name__)
+        self.changed_chapters = []
 
     def run(self):
         novel_path = self.config.get('global', 'novel_path')
@@ -20,13 +23,56 @@ class ChapterSplitter(BaseAnalyzer):
         self.file_processor.create_output_structure(output_dir)
         chapter_regex = self.config.get('chapter_split', 'regex', r'第[零一二三四五六七八九十百千0-9]+章')
         encoding_setting = self.config.get('chapter_split', 'encoding', 'auto')
+        storage = self.config.get('chapter_split', 'storage', 'files')
+        incremental = self.config.get('chapter_split', 'incremental', 'true') == 'true'
+
+        # 源文件和分割配置都未变化时直接复用上次的分割结果；
+        # 没有记录时不沿用旧结果，交给增量分割按清单比对
+        build_state = self.get_build_state()
+        recorded = build_state.recorded('chapter_split') or {}
+        stat = os.stat(novel_path)
+        inputs = {
+            'stat': f'{stat.st_size}:{stat.st_mtime_ns}',
+            'config': digest({'regex': chapter_regex, 'encoding': encoding_setting, 'storage': storage})
+        }
+        # 大小和修改时间未变时沿用记录的内容哈希，变化时才读全文计算
+        if recorded.get('stat') == inputs['stat'] and recorded.get('source'):
+            inputs['source'] = recorded['source']
+        else:
+            inputs['source'] = digest_file(novel_path)
+        manifest = self.file_processor.load_split_manifest(output_dir)
+        if (manifest and manifest['chapters'] and recorded.get('source') == inputs['source']
+                and recorded.get('config') == inputs['config']):
+            if recorded != inputs:
+                # 内容未变，只是修改时间变了
+                build_state.record('chapter_split', inputs)
+            self.changed_chapters = []
+            self.logger.info(f"小说文件与分割配置未变化，复用已有的 {len(manifest['chapters'])} 个章节")
+            return True
 
         self.logger.info("开始章节分割...")
         chapter_files = self.file_processor.split_chapters(
-            novel_path, output_dir, chapter_regex, encoding=encoding_setting
+            novel_path, output_dir, chapter_regex, encoding=encoding_setting, storage=storage,
+            incremental=incremental
         )
 
         if chapter_files:
             self.logger.info(f"成功分割 {len(chapter_files)} 个章节")
+            self._invalidate_summaries(output_dir)
+            build_state.record('chapter_split', inputs)
             return True
-        return False
\ No newline at end of file
+        return False
+
+    def _invalidate_summaries(self, output_dir):
+        """删除内容已变化或已不存在章节的阶段一摘要，使其在下次运行时重新生成"""
+        manifest = self.file_processor.load_split_manifest(output_dir)
+        if not manifest:
+            return
+        self.changed_chapters = manifest['changed']
+        if not manifest['previous']:
+            return
+        removed = SummaryStore.for_output_dir(output_dir).delete(manifest['changed'] + manifest['removed'])
+        if self.changed_chapters:
+            self.logger.info(f"新增或变化的章节: {self.changed_chapters}")
+        if removed:
+            self.logger.info(f"已删除 {removed} 个过期的章节摘要")
\ No newline at end of file
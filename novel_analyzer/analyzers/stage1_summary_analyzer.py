@@ -2,17 +2,20 @@
 import json
 import os
 import logging
-import re
-import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from .base_analyzer import BaseAnalyzer
 from config_manager import ConfigManager
 from file_processor import FileProcessor
+from summary_store import SummaryStore
+from terminology_store import TerminologyStore
+from build_state import digest
+import json_codec
 
 
 class Stage1SummaryAnalyzer(BaseAnalyzer):
-    def __init__(self, config_manager):
-        super().__init__(config_manager)
-        self.terminology = config_manager.load_terminology()
+    def __init__(self, config_manager, api_handler=None):
+        super().__init__(config_manager, api_handler)
+        self.terminology = TerminologyStore.for_output_dir(self.get_output_dir())
         self.logger = logging.getLogger(__name__)
         self.default_prompt = """
         # 角色：小说分析师
@@ -40,16 +43,35 @@ class Stage1SummaryAnalyzer(BaseAnalyzer):
         4. 删除对话和环境描写"""
 
     def build_prompt(self, chapter_title, chapter_content):
-        term_binding = json.dumps(self.terminology, ensure_ascii=False)
+        chapter_content = chapter_content[:8000]
+        term_binding = json.dumps(self.select_terms(chapter_title + '\n' + chapter_content), ensure_ascii=False)
         custom_prompt = self.config.get('stage1', 'prompt', self.default_prompt)
 
         prompt = custom_prompt.replace('{term_binding}', term_binding) \
             .replace('{chapter_title}', chapter_title) \
-            .replace('{chapter_content}', chapter_content[:8000])
+            .replace('{chapter_content}', chapter_content)
         return prompt
 
+    def select_terms(self, text):
+        """只绑定章节中实际出现的术语，另加少量核心人物，提示词大小不随术语表增长"""
+        if self.config.get('stage1', 'term_binding', 'true') != 'true':
+            return {}
+        found = self.terminology.find_in(text)
+        core = [name.strip() for name in self.config.get('stage1', 'core_terms', '').split(',') if name.strip()]
+        try:
+            core_count = int(self.config.get('stage1', 'core_term_count', '10'))
+        except ValueError:
+            core_count = 10
+        # 不用本进程内的出现次数挑选，避免同一章节因运行顺序不同得到不同提示词（影响响应缓存与构建指纹）
+        core.extend(self.terminology.earliest(core_count))
+        selected = self.terminology.get_many(dict.fromkeys(found + core))
+        self.logger.debug(f"术语绑定: 选中 {len(selected)}/{len(self.terminology)} 条")
+        return selected
+
     def run(self):
         output_dir = self.get_output_dir()
+        # 所有工作线程共享同一个术语表实例
+        self.terminology = TerminologyStore.for_output_dir(output_dir)
         chapter_dir = os.path.join(output_dir, 'chapters')
         summary_dir = os.path.join(output_dir, 'stage1_summaries')
 
@@ -60,78 +82,103 @@ class Stage1SummaryAnalyzer(BaseAnalyzer):
         chapter_range = self.get_chapter_range(
             self.config.get('stage1', 'chapter_range', 'all')
         )
-        chapter_files = FileProcessor.get_chapter_files(output_dir)
-        if not chapter_files:
+        storage = self.config.get('chapter_split', 'storage', 'files')
+        chapter_source = FileProcessor.open_chapter_source(output_dir, storage)
+        if not chapter_source or not len(chapter_source):
             self.logger.error("未找到章节文件")
             return False
 
         os.makedirs(summary_dir, exist_ok=True)
         success_count = 0
-        total_chapters = len(chapter_files)
         to_process = []
         processed_count = 0
 
-        for chapter_file in chapter_files:
-            filename = os.path.basename(chapter_file)
-            match = re.match(r'ch_(\d+)\.txt', filename)
-            if not match:
-                self.logger.error(f"无效的章节文件名: {filename}")
-                continue
-
-            chapter_num = int(match.group(1))
+        for chapter_num in chapter_source.chapter_numbers():
             if chapter_range and chapter_num not in chapter_range:
                 self.logger.info(f"跳过章节 {chapter_num} (不在指定范围内)")
                 continue
-
-            to_process.append((chapter_file, chapter_num))
+            to_process.append(chapter_num)
 
         total_to_process = len(to_process)
         if total_to_process == 0:
             self.logger.warning("没有需要处理的章节")
+            chapter_source.close()
             return False
 
-        for idx, (chapter_file, chapter_num) in enumerate(to_process):
-            if not self.check_pause() or self.check_stop():
-                self.logger.info("任务被用户中断")
-                return False
-
-            processed_count = idx + 1
-            progress_message = f"处理章节 {chapter_num} ({processed_count}/{total_to_process})"
-            self.update_progress(processed_count, total_to_process, progress_message)
-
-            if self.process_chapter(chapter_file, chapter_num):
-                success_count += 1
-                self.logger.info(f"章节 {chapter_num} 处理成功")
+        # 有界工作池：始终保持 max_workers 个章节请求在途，速率由限流器统一控制
+        max_workers = min(self.get_concurrency(), total_to_process)
+        self.logger.info(f"并发处理章节，工作线程数: {max_workers}")
+        pending = {}
+        queue = iter(to_process)
+        interrupted = False
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='stage1') as executor:
+            while True:
+                while not interrupted and len(pending) < max_workers:
+                    if not self.check_pause() or self.check_stop():
+                        interrupted = True
+                        break
+                    chapter_num = next(queue, None)
+                    if chapter_num is None:
+                        break
+                    future = executor.submit(self.process_chapter, chapter_source, chapter_num)
+                    pending[future] = chapter_num
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chapter_num = pending.pop(future)
+                    processed_count += 1
+                    if future.result():
+                        success_count += 1
+                        self.logger.info(f"章节 {chapter_num} 处理成功")
+                    progress_message = f"完成章节 {chapter_num} ({processed_count}/{total_to_process})"
+                    self.update_progress(processed_count, total_to_process, progress_message)
+
+        chapter_source.close()
+        # 把本次运行追加的术语写回 terminology.json
+        self.terminology.compact()
+        if interrupted:
+            self.logger.info(f"任务被用户中断，已完成 {success_count}/{total_to_process}")
+            return False
 
         FileProcessor.export_summary_excel(output_dir)
         self.logger.info(f"章节摘要生成完成: {success_count}/{total_to_process}")
+        cache_stats = self.api_handler.get_cache_stats()
+        if cache_stats:
+            self.logger.info(f"响应缓存: 命中 {cache_stats['hits']}, 未命中 {cache_stats['misses']}")
         return success_count > 0
 
-    def process_chapter(self, chapter_path, chapter_num):
-        output_path = os.path.join(
-            self.get_output_dir(),
-            'stage1_summaries',
-            f'summary_{chapter_num:03d}.json'
-        )
-
-        if os.path.exists(output_path):
-            self.logger.info(f"跳过已处理章节: ch_{chapter_num:03d}")
-            return True
+    def process_chapter(self, chapter_source, chapter_num):
+        store = SummaryStore.for_output_dir(self.get_output_dir())
+        build_state = self.get_build_state()
+        artifact = f'stage1/{chapter_num}'
 
         try:
-            with open(chapter_path, 'r', encoding='utf-8') as f:
-                content = f.read().split('\n', 1)
-                chapter_title = content[0]
-                chapter_content = content[1] if len(content) > 1 else ""
+            chapter_text = chapter_source.read_chapter(chapter_num)
+            # 章节内容、提示词模板或阶段配置变化时才重新生成
+            inputs = {
+                'chapter': digest(chapter_text),
+                'prompt': digest(self.config.get('stage1', 'prompt', self.default_prompt)),
+                'config': self.config_digest('stage1', exclude=('prompt', 'chapter_range'))
+            }
+            if build_state.is_current(artifact, inputs, store.has(chapter_num), self.logger):
+                self.logger.info(f"跳过已处理章节: ch_{chapter_num:03d}")
+                return True
+
+            content = chapter_text.split('\n', 1)
+            chapter_title = content[0]
+            chapter_content = content[1] if len(content) > 1 else ""
 
             prompt = self.build_prompt(chapter_title, chapter_content)
             response = self.api_handler.generate(prompt)
             result = self._parse_response(response)
             result['chapter'] = chapter_num
             self._update_terminology(result)
-
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
+            store.put(chapter_num, result)
+            build_state.record(artifact, inputs)
 
             return True
         except Exception as e:
@@ -142,7 +189,7 @@ class Stage1SummaryAnalyzer(BaseAnalyzer):
         try:
             start = response.find('{')
             end = response.rfind('}') + 1
-            return json.loads(response[start:end])
+            return json_codec.loads(response[start:end])
         except json.JSONDecodeError:
             self.logger.error(f"API响应解析失败: {response}")
             raise ValueError("API返回了无效的JSON格式")
@@ -158,4 +205,5 @@ class Stage1SummaryAnalyzer(BaseAnalyzer):
             if name not in self.terminology:
                 new_terms[name] = name
         if new_terms:
-            self.terminology = self.config.update_terminology(new_terms)
\ No newline at end of file
+            # 术语表自行加锁，已存在的名称不会被覆盖
+            self.terminology.add(new_terms)
\ No newline at end of file
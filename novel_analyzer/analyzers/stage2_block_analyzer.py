@@ -3,19 +3,26 @@ import json
 import os
 import logging
 import numpy as np
-from sklearn.cluster import DBSCAN
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from collections import defaultdict
 from .base_analyzer import BaseAnalyzer
+from token_budget import PromptTooLongError
+from summary_store import SummaryStore
+from segmentation import segment, block_starts, shift_peaks, merge_starts
+from topic_features import topic_shift
+from build_state import digest
+import json_codec
 
 
 class Stage2BlockAnalyzer(BaseAnalyzer):
-    def __init__(self, config_manager):
-        super().__init__(config_manager)
+    def __init__(self, config_manager, api_handler=None):
+        super().__init__(config_manager, api_handler)
         self.logger = logging.getLogger(__name__)
+        # 灵敏度越高：最短段越短、变点惩罚系数与主题差异阈值越小，切出的段越多
         self.sensitivity_map = {
-            'low': {'min_pts': 8, 'eps': 1.2},
-            'medium': {'min_pts': 5, 'eps': 1.0},
-            'high': {'min_pts': 3, 'eps': 0.8}
+            'low': {'min_size': 8, 'penalty': 1.2, 'topic_cutoff': 1.0},
+            'medium': {'min_size': 5, 'penalty': 1.0, 'topic_cutoff': 0.5},
+            'high': {'min_size': 3, 'penalty': 0.8, 'topic_cutoff': 0.0}
         }
         self.default_prompt = """# 角色：分块分析师
 # 输入：章节摘要列表
@@ -47,31 +54,36 @@ class Stage2BlockAnalyzer(BaseAnalyzer):
             return False
 
         output_dir = self.get_output_dir()
-        summary_dir = os.path.join(output_dir, 'stage1_summaries')
         block_path = os.path.join(output_dir, 'stage2_blocks', 'blocks.json')
 
-        # 跳过已存在的结果
-        if os.path.exists(block_path):
-            self.logger.info("分块结果已存在，跳过处理")
-            return True
-
         # 加载所有摘要
         self.update_progress(0, 100, "加载章节摘要...")
-        summaries = self._load_summaries(summary_dir)
+        summaries = SummaryStore.for_output_dir(output_dir).load_all()
         if not summaries:
             self.logger.error("未找到章节摘要，请先完成阶段1分析")
             return False
 
+        # 摘要、提示词和配置都未变化时跳过
+        build_state = self.get_build_state()
+        inputs = {
+            'summaries': digest(summaries),
+            'prompt': digest(self.config.get('stage2', 'prompt', self.default_prompt)),
+            'config': self.config_digest('stage2')
+        }
+        if build_state.is_current('stage2', inputs, os.path.exists(block_path), self.logger):
+            self.logger.info("分块结果已存在，跳过处理")
+            return True
+
         total_steps = 5  # 总步骤数
         current_step = 1
         self.logger.info(f"成功加载 {len(summaries)} 个章节摘要")
 
-        # 预聚类分组
-        self.update_progress(current_step * 20, 100, "进行章节聚类...")
+        # 变点分段
+        self.update_progress(current_step * 20, 100, "进行章节分段...")
         if not self.check_pause() or self.check_stop():
             return False
         clusters = self._pre_cluster(summaries)
-        self.logger.info(f"聚类完成，得到 {len(clusters)} 个初始分组")
+        self.logger.info(f"分段完成，得到 {len(clusters)} 个初始分组")
         current_step += 1
 
         # 应用分块规则
@@ -82,6 +94,15 @@ class Stage2BlockAnalyzer(BaseAnalyzer):
         self.logger.info(f"分块完成，得到 {len(blocks)} 个情节块")
         current_step += 1
 
+        # 章节过多时整本摘要放不进一个请求，改为分窗并行请求后在重叠处拼接边界
+        window_size, window_overlap = self._window_params()
+        if len(summaries) > window_size:
+            self.update_progress(current_step * 20, 100, "分窗调用API进行分块分析...")
+            result = self._analyze_windows(summaries, clusters, window_size, window_overlap)
+            if result is None:
+                return False
+            return self._save_result(block_path, result, build_state, inputs)
+
         # 构建提示词
         self.update_progress(current_step * 20, 100, "构建API提示词...")
         if not self.check_pause() or self.check_stop():
@@ -96,6 +117,10 @@ class Stage2BlockAnalyzer(BaseAnalyzer):
             if not self.check_pause() or self.check_stop():
                 return False
             response = self.api_handler.generate(prompt)
+        except PromptTooLongError as e:
+            # 分块本身由本地规则完成，提示词放不下时仅跳过API校验
+            self.logger.warning(f"章节摘要超出模型上下文，跳过API校验: {str(e)}")
+            response = json.dumps({"alert": "章节摘要超出模型上下文，未经API校验"}, ensure_ascii=False)
         except Exception as e:
             self.logger.error(f"API调用失败: {str(e)}")
             return False
@@ -105,26 +130,16 @@ class Stage2BlockAnalyzer(BaseAnalyzer):
             result = self.parse_response(response)
             # 添加聚类结果
             result['blocks'] = blocks
-            # 保存结果
-            os.makedirs(os.path.dirname(block_path), exist_ok=True)
-            with open(block_path, 'w', encoding='utf-8') as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
-
-            self.update_progress(100, 100, "分块分析完成")
-            self.logger.info("分块分析完成")
-            return True
         except Exception as e:
             self.logger.error(f"分块分析失败: {str(e)}")
             return False
+        return self._save_result(block_path, result, build_state, inputs)
+
+    def _save_result(self, block_path, result, build_state, inputs):
         try:
-            # 解析API响应
-            result = self.parse_response(response)
-            # 添加聚类结果
-            result['blocks'] = blocks
-            # 保存结果
             os.makedirs(os.path.dirname(block_path), exist_ok=True)
-            with open(block_path, 'w', encoding='utf-8') as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
+            json_codec.write_json(block_path, result)
+            build_state.record('stage2', inputs)
 
             self.update_progress(100, 100, "分块分析完成")
             self.logger.info("分块分析完成")
@@ -148,131 +163,180 @@ class Stage2BlockAnalyzer(BaseAnalyzer):
             })
 
         # 替换占位符
-        prompt = custom_prompt + "\n\n# 章节摘要数据:\n" + json.dumps(summary_data, ensure_ascii=False, indent=2)
+        prompt = custom_prompt + "\n\n# 章节摘要数据:\n" + json.dumps(summary_data, ensure_ascii=False,
+                                                                  separators=(',', ':'))
         return prompt
 
+    def _window_params(self):
+        try:
+            window_size = max(2, int(self.config.get('stage2', 'window_size', '200')))
+            window_overlap = int(self.config.get('stage2', 'window_overlap', '20'))
+        except ValueError:
+            window_size, window_overlap = 200, 20
+        return window_size, min(max(0, window_overlap), window_size // 2)
+
+    @staticmethod
+    def _window_ranges(count, window_size, window_overlap):
+        """按章节下标切出窗口 [(起, 止)]，相邻窗口重叠 window_overlap 章"""
+        step = window_size - window_overlap
+        windows = []
+        start = 0
+        while True:
+            end = min(start + window_size, count)
+            windows.append((start, end))
+            if end >= count:
+                return windows
+            start += step
+
+    def _analyze_windows(self, summaries, clusters, window_size, window_overlap):
+        """map：各窗口并行请求局部分块边界；reduce：拼接后按分块规则合并成全局分块。用户停止时返回 None"""
+        windows = self._window_ranges(len(summaries), window_size, window_overlap)
+        self.logger.info(f"共 {len(summaries)} 章，分 {len(windows)} 个窗口并行分析"
+                         f"（每窗 {window_size} 章，重叠 {window_overlap} 章）")
+        results = [None] * len(windows)
+        max_workers = min(self.get_concurrency(), len(windows))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='stage2') as executor:
+            futures = {
+                executor.submit(self._analyze_window, summaries[start:end]): index
+                for index, (start, end) in enumerate(windows)
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                results[futures[future]] = future.result()
+                self.update_progress(done, len(windows), f"窗口分析 {done}/{len(windows)}")
+                if self.check_stop():
+                    for pending in futures:
+                        pending.cancel()
+                    self.logger.info("任务被用户中断")
+                    return None
+        return self._reconcile_windows(summaries, clusters, windows, results)
+
+    def _analyze_window(self, window_summaries):
+        """请求单个窗口的局部分块，返回 ({块首章: 核心冲突}, 异常提示)；失败时边界为 None"""
+        first, last = window_summaries[0]['chapter'], window_summaries[-1]['chapter']
+        if not self.check_pause() or self.check_stop():
+            return None, None
+        try:
+            local = self.parse_response(self.api_handler.generate(self.build_prompt(window_summaries)))
+        except PromptTooLongError as e:
+            self.logger.warning(f"第{first}-{last}章超出模型上下文，该窗口改用本地规则: {str(e)}")
+            return None, "超出模型上下文，已改用本地规则分块"
+        except Exception as e:
+            self.logger.error(f"第{first}-{last}章分块请求失败，该窗口改用本地规则: {str(e)}")
+            return None, "API分块失败，已改用本地规则分块"
+
+        blocks = local.get('blocks', []) if isinstance(local, dict) else None
+        if not isinstance(blocks, list) or not all(
+                isinstance(block, dict) and isinstance(block.get('chapters', []), list) for block in blocks):
+            self.logger.error(f"第{first}-{last}章分块响应格式无效，该窗口改用本地规则: {str(local)[:200]}")
+            return None, "API返回的分块格式无效，已改用本地规则分块"
+
+        boundaries = {}
+        for block in blocks:
+            chapters = []
+            for chapter in block.get('chapters', []):
+                try:
+                    chapters.append(int(chapter))
+                except (TypeError, ValueError):
+                    continue
+            if chapters:
+                boundaries[min(chapters)] = block.get('main_conflict') or None
+        return boundaries, local.get('alert')
+
+    def _reconcile_windows(self, summaries, clusters, windows, results):
+        """相邻窗口在重叠区中点交接，每个窗口只采纳自己负责区段内的块边界，
+        请求失败的窗口在该区段内沿用本地分段的边界；拼接出的边界与单次请求时一样经过分块规则合并"""
+        chapters = [s['chapter'] for s in summaries]
+        index_of = {chapter: index for index, chapter in enumerate(chapters)}
+        local_starts = [(index_of[cluster[0]], None) for cluster in clusters]
+        handover = [0] + [(windows[i + 1][0] + windows[i][1]) // 2 for i in range(len(windows) - 1)] \
+            + [len(chapters)]
+
+        starts = {0: None}
+        alerts = []
+        for i, (boundaries, alert) in enumerate(results):
+            own_start, own_end = handover[i], handover[i + 1]
+            if boundaries is None:
+                candidates = local_starts
+            else:
+                candidates = [(index_of[ch], conflict) for ch, conflict in boundaries.items() if ch in index_of]
+            for index, conflict in candidates:
+                if own_start <= index < own_end:
+                    starts[index] = conflict or starts.get(index)
+            if alert:
+                alerts.append(f"第{chapters[own_start]}-{chapters[own_end - 1]}章: {alert}")
+
+        ordered = sorted(starts)
+        merged_blocks = self._apply_block_rules(
+            [chapters[start:end] for start, end in zip(ordered, ordered[1:] + [len(chapters)])], summaries)
+        for block in merged_blocks:
+            conflict = starts.get(index_of[block['chapters'][0]])
+            if conflict:
+                block['main_conflict'] = conflict
+        self.logger.info(f"窗口边界拼接完成，{len(ordered)} 个边界经分块规则合并为 {len(merged_blocks)} 个情节块")
+
+        result = {'blocks': merged_blocks}
+        if alerts:
+            result['alert'] = "; ".join(alerts)
+        return result
+
     def parse_response(self, response):
         """解析API响应"""
         try:
             # 尝试提取JSON部分
             start = response.find('{')
             end = response.rfind('}') + 1
-            return json.loads(response[start:end])
+            return json_codec.loads(response[start:end])
         except json.JSONDecodeError:
             self.logger.error(f"API响应解析失败: {response}")
             raise ValueError("API返回了无效的JSON格式")
 
-    def _load_summaries(self, summary_dir):
-        """加载所有章节摘要，支持0编号的前言"""
-        summaries = []
-        # 获取所有摘要文件并按数字排序
-        summary_files = []
-        for fname in os.listdir(summary_dir):
-            if fname.endswith('.json'):
-                # 提取数字部分
-                try:
-                    num_part = re.search(r'summary_(\d+)\.json', fname).group(1)
-                    num = int(num_part)
-                    summary_files.append((num, fname))
-                except:
-                    continue
-
-        # 按章节号排序
-        summary_files.sort(key=lambda x: x[0])
-
-        # 加载摘要内容
-        for num, fname in summary_files:
-            with open(os.path.join(summary_dir, fname), 'r', encoding='utf-8') as f:
-                summary = json.load(f)
-                # 确保章节号正确
-                summary['chapter'] = num
-                summaries.append(summary)
-
-        return summaries
-
     def _pre_cluster(self, summaries):
-        """使用DBSCAN预聚类"""
-        # 提取特征：转折分序列
-        scores = [s['turning_score'] for s in summaries]
+        """按章节顺序对转折分序列做变点分段，再补入摘要主题明显转换处的边界，得到连续的章节分组"""
+        # 提取特征：按章节排序的转折分序列
+        scores = np.array([s['turning_score'] for s in summaries], dtype=float)
 
-        # 配置聚类参数
+        # 配置分段参数
         sensitivity = self.config.get('stage2', 'block_sensitivity', fallback='medium')
         params = self.sensitivity_map.get(sensitivity, self.sensitivity_map['medium'])
 
-        # 执行聚类
-        X = np.array(scores).reshape(-1, 1)
-        clustering = DBSCAN(eps=params['eps'], min_samples=params['min_pts']).fit(X)
-
-        # 构建聚类结果
-        clusters = {}
-        for i, label in enumerate(clustering.labels_):
-            if label not in clusters:
-                clusters[label] = []
-            clusters[label].append(summaries[i]['chapter'])
-
-        return list(clusters.values())
+        # 执行分段
+        chapters = [s['chapter'] for s in summaries]
+        segments = segment(scores, scale=params['penalty'], min_size=params['min_size'])
+        starts = [start for start, _ in segments]
+
+        # 本地主题特征：相邻窗口摘要的 TF-IDF 差异峰值作为补充边界，不调用API
+        if self.config.get('stage2', 'topic_shift', 'true') == 'true':
+            try:
+                topic_window = max(1, int(self.config.get('stage2', 'topic_window', '3')))
+            except ValueError:
+                topic_window = 3
+            shift = topic_shift(summaries, window=topic_window)
+            peaks = shift_peaks(shift, cutoff=params['topic_cutoff'], radius=max(1, params['min_size'] // 2))
+            starts = merge_starts(starts, peaks, len(chapters), params['min_size'])
+            self.logger.info(f"主题转换检测到 {len(peaks)} 个候选边界")
+
+        ends = starts[1:] + [len(chapters)]
+        return [chapters[start:end] for start, end in zip(starts, ends)]
 
     def _apply_block_rules(self, clusters, summaries):
-        """应用分块规则"""
-        blocks = []
-        current_block = []
+        """应用分块规则：在连续分组的起点数组上做向量化合并，最后按区间切出各块"""
+        if not clusters:
+            return []
         chapter_map = {s['chapter']: s for s in summaries}
-
-        for cluster in clusters:
-            # 规则1: 转折分≥4或章节数达25章
-            if any(chapter_map[ch]['turning_score'] >= 4 for ch in cluster) or len(cluster) >= 25:
-                if current_block:
-                    blocks.append(self._finalize_block(current_block, chapter_map))
-                current_block = cluster
-            else:
-                current_block.extend(cluster)
-
-        if current_block:
-            blocks.append(self._finalize_block(current_block, chapter_map))
-
-        # 规则2: 连续低分章节合并
-        merged_blocks = []
-        for block in blocks:
-            if not merged_blocks:
-                merged_blocks.append(block)
-                continue
-
-            # 检查是否为低分块
-            low_score_chapters = [ch for ch in block['chapters'] if chapter_map[ch]['turning_score'] <= 1]
-            if len(low_score_chapters) >= 5:
-                # 合并到前一块
-                prev_block = merged_blocks[-1]
-                prev_block['chapters'].extend(block['chapters'])
-                prev_block['chapters'].sort()
-                # 更新转折点
-                prev_turning_points = set(prev_block.get('turning_points', []))
-                prev_turning_points.update(block.get('turning_points', []))
-                prev_block['turning_points'] = sorted(prev_turning_points)
-            else:
-                merged_blocks.append(block)
-
-        # 规则3: 块边界校验
-        final_blocks = []
-        for i, block in enumerate(merged_blocks):
-            # 确保每块至少有一个高分转折
-            if not any(chapter_map[ch]['turning_score'] >= 3 for ch in block['chapters']):
-                # 向前合并
-                if i > 0:
-                    prev_block = final_blocks[-1]
-                    prev_block['chapters'].extend(block['chapters'])
-                    prev_block['chapters'].sort()
-                    # 更新转折点
-                    prev_turning_points = set(prev_block.get('turning_points', []))
-                    prev_turning_points.update(block.get('turning_points', []))
-                    prev_block['turning_points'] = sorted(prev_turning_points)
-                else:
-                    # 第一块无法向前合并，标记异常
-                    block['alert'] = "缺乏高分转折章节"
-                    final_blocks.append(block)
-            else:
-                final_blocks.append(block)
-
-        return final_blocks
+        chapters = [s['chapter'] for s in summaries]
+        scores = np.array([s['turning_score'] for s in summaries], dtype=float)
+        segment_starts = np.cumsum([0] + [len(cluster) for cluster in clusters[:-1]])
+
+        starts, lacks_turning = block_starts(scores, segment_starts)
+        ends = np.append(starts[1:], len(chapters))
+        blocks = [
+            self._finalize_block(chapters[start:end], chapter_map)
+            for start, end in zip(starts.tolist(), ends.tolist())
+        ]
+        if lacks_turning:
+            # 第一块无法向前合并，标记异常
+            blocks[0]['alert'] = "缺乏高分转折章节"
+        return blocks
 
     def _finalize_block(self, chapters, chapter_map):
         """完成块的构建"""
@@ -6,12 +6,18 @@ from .base_analyzer import BaseAnalyzer
 import json
 import os
 import logging
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from .base_analyzer import BaseAnalyzer
+from token_budget import PromptTooLongError
+from summary_store import SummaryStore
+from build_state import digest
+import json_codec
 
 
 class Stage3PlotAnalyzer(BaseAnalyzer):
-    def __init__(self, config_manager):
-        super().__init__(config_manager)
+    def __init__(self, config_manager, api_handler=None):
+        super().__init__(config_manager, api_handler)
         self.logger = logging.getLogger(__name__)
         self.default_prompt = """# 角色：情节分析师
 # 输入：情节块信息
@@ -52,56 +58,127 @@ class Stage3PlotAnalyzer(BaseAnalyzer):
             self.logger.error("分块结果不存在，请先完成阶段2分析")
             return False
 
-        with open(block_path, 'r', encoding='utf-8') as f:
-            block_data = json.load(f)
+        block_data = json_codec.read_json(block_path)
 
         # 处理每个情节块
-        success_count = 0
         total_blocks = len(block_data['blocks'])
-
+        build_state = self.get_build_state()
+        prompt_digest = digest(self.config.get('stage3', 'prompt', self.default_prompt))
+        config_digest = self.config_digest('stage3')
+        os.makedirs(plot_dir, exist_ok=True)
+        self._remove_stale_plots(plot_dir, total_blocks, build_state)
+
+        # 章节摘要一次性读入内存，所有块的工作线程共享这份只读缓存
+        summary_cache = MappingProxyType({
+            s['chapter']: s for s in SummaryStore.for_output_dir(output_dir).load_all()
+        })
+
+        to_process = []
         for idx, block in enumerate(block_data['blocks']):
-            # 检查暂停/停止请求
-            if not self.check_pause() or self.check_stop():
-                return False
-
             block_id = idx + 1
             plot_path = os.path.join(plot_dir, f'block_{block_id}.json')
-
-            if os.path.exists(plot_path):
+            artifact = f'stage3/{block_id}'
+
+            # 块划分、块内章节摘要、提示词或配置变化时才重新生成
+            summaries = [summary_cache[ch] for ch in block['chapters'] if ch in summary_cache]
+            inputs = {
+                'block': digest(block),
+                'summaries': digest(summaries),
+                'prompt': prompt_digest,
+                'config': config_digest
+            }
+            if build_state.is_current(artifact, inputs, os.path.exists(plot_path), self.logger):
                 self.logger.info(f"跳过已处理块: block_{block_id}")
                 continue
+            to_process.append((block_id, block, summaries, plot_path, artifact, inputs))
+
+        total_to_process = len(to_process)
+        if total_to_process == 0:
+            self.logger.info(f"全部 {total_blocks} 个情节块已是最新")
+            return True
 
-            # 更新进度
-            if self.progress_callback:
-                self.progress_callback(idx + 1, total_blocks, f"处理块 {block_id}")
+        # 有界工作池：始终保持 max_workers 个块请求在途，速率由限流器统一控制
+        max_workers = min(self.get_concurrency(), total_to_process)
+        self.logger.info(f"并发处理情节块，工作线程数: {max_workers}")
+        success_count = 0
+        processed_count = 0
+        pending = {}
+        queue = iter(to_process)
+        interrupted = False
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='stage3') as executor:
+            while True:
+                while not interrupted and len(pending) < max_workers:
+                    if not self.check_pause() or self.check_stop():
+                        interrupted = True
+                        break
+                    task = next(queue, None)
+                    if task is None:
+                        break
+                    future = executor.submit(self._process_block, build_state, *task)
+                    pending[future] = task[0]
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    block_id = pending.pop(future)
+                    processed_count += 1
+                    if future.result():
+                        success_count += 1
+                    self.update_progress(processed_count, total_to_process,
+                                         f"完成块 {block_id} ({processed_count}/{total_to_process})")
+
+        if interrupted:
+            self.logger.info(f"任务被用户中断，已完成 {success_count}/{total_to_process}")
+            return False
 
-            plot_summary = self._generate_plot_summary(block_id, block, output_dir)
-            if plot_summary:
-                with open(plot_path, 'w', encoding='utf-8') as f:
-                    json.dump(plot_summary, f, ensure_ascii=False, indent=2)
-                success_count += 1
+        # 已是最新而跳过的块同样计入成功
+        skipped_count = total_blocks - total_to_process
+        self.logger.info(f"情节块摘要生成完成: {success_count + skipped_count}/{total_blocks}")
+        return success_count + skipped_count > 0
 
-        self.logger.info(f"情节块摘要生成完成: {success_count}/{total_blocks}")
-        return success_count > 0
+    def _process_block(self, build_state, block_id, block, summaries, plot_path, artifact, inputs):
+        plot_summary = self._generate_plot_summary(block_id, block, summaries)
+        if not plot_summary:
+            return False
+        json_codec.write_json(plot_path, plot_summary)
+        build_state.record(artifact, inputs)
+        return True
+
+    def _remove_stale_plots(self, plot_dir, total_blocks, build_state):
+        """块数量减少后，删除编号超出范围的旧块摘要及其记录"""
+        if not os.path.isdir(plot_dir):
+            return
+        for name in os.listdir(plot_dir):
+            stem, ext = os.path.splitext(name)
+            if ext != '.json' or not stem.startswith('block_') or not stem[6:].isdigit():
+                continue
+            block_id = int(stem[6:])
+            if block_id > total_blocks:
+                os.remove(os.path.join(plot_dir, name))
+                build_state.forget([f'stage3/{block_id}'])
+                self.logger.info(f"删除过期块摘要: {name}")
 
-    def _generate_plot_summary(self, block_id, block, output_dir):
+    def _generate_plot_summary(self, block_id, block, summaries):
         """生成单个情节块摘要"""
-        # 加载相关章节摘要
-        summaries = []
-        summary_dir = os.path.join(output_dir, 'stage1_summaries')
-        for ch in block['chapters']:
-            summary_path = os.path.join(summary_dir, f'summary_{ch:03d}.json')
-            if os.path.exists(summary_path):
-                with open(summary_path, 'r', encoding='utf-8') as f:
-                    summaries.append(json.load(f))
-
         if not summaries:
             return None
 
         # 构建提示词
         prompt = self.build_prompt(block_id, block, summaries)
         try:
-            response = self.api_handler.generate(prompt)
+            try:
+                response = self.api_handler.generate(prompt)
+            except PromptTooLongError as e:
+                # 超出上下文时只保留核心字段重建提示词，仍放不下则直接放弃，不浪费重试
+                self.logger.warning(f"块{block_id}提示词过长，精简摘要后重试: {str(e)}")
+                compact = [
+                    {key: s.get(key) for key in ('chapter', 'summary', 'turning_score')}
+                    for s in summaries
+                ]
+                response = self.api_handler.generate(self.build_prompt(block_id, block, compact))
         except Exception as e:
             self.logger.error(f"块{block_id}摘要生成失败: {str(e)}")
             return None
@@ -110,7 +187,7 @@ class Stage3PlotAnalyzer(BaseAnalyzer):
         try:
             start = response.find('{')
             end = response.rfind('}') + 1
-            result = json.loads(response[start:end])
+            result = json_codec.loads(response[start:end])
             result['block_id'] = block_id
             return result
         except Exception as e:
@@ -130,5 +207,5 @@ class Stage3PlotAnalyzer(BaseAnalyzer):
                      .replace('{chapters}', str(len(block['chapters']))) \
                      .replace('{main_conflict}', block.get('main_conflict', '')) \
                      .replace('{turning_points}', ', '.join(str(tp) for tp in turning_points)) \
-                 + "\n\n# 章节摘要数据:\n" + json.dumps(summaries, ensure_ascii=False, indent=2)
+                 + "\n\n# 章节摘要数据:\n" + json.dumps(summaries, ensure_ascii=False, separators=(',', ':'))
         return prompt
\ No newline at end of file
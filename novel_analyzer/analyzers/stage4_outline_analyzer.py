@@ -2,12 +2,16 @@ import json
 import os
 import logging
 from .base_analyzer import BaseAnalyzer
+from api_handler import GenerationCancelled
+from build_state import digest
+import json_codec
 
 
 class Stage4OutlineAnalyzer(BaseAnalyzer):
-    def __init__(self, config_manager):
-        super().__init__(config_manager)
+    def __init__(self, config_manager, api_handler=None):
+        super().__init__(config_manager, api_handler)
         self.logger = logging.getLogger(__name__)
+        self.stream_callback = None
         self.default_prompt = """# 角色：大纲分析师
 # 输入：情节块摘要
 # 输出要求（Markdown格式）：
@@ -60,31 +64,66 @@ class Stage4OutlineAnalyzer(BaseAnalyzer):
                 return False, None
 
             if fname.endswith('.json'):
-                with open(os.path.join(plot_dir, fname), 'r', encoding='utf-8') as f:
-                    plot_summaries.append(json.load(f))
+                plot_summaries.append(json_codec.read_json(os.path.join(plot_dir, fname)))
 
         if not plot_summaries:
             self.logger.error("未找到情节块摘要")
             return False, None
 
+        # 情节块摘要、提示词和配置都未变化时直接返回已有大纲
+        build_state = self.get_build_state()
+        inputs = {
+            'plots': digest(plot_summaries),
+            'prompt': digest(self.config.get('stage4', 'prompt', self.default_prompt)),
+            'config': self.config_digest('stage4')
+        }
+        if build_state.is_current('stage4', inputs, os.path.exists(outline_path), self.logger):
+            self.logger.info("大纲已是最新，跳过生成")
+            with open(outline_path, 'r', encoding='utf-8') as f:
+                outline = f.read()
+            # 界面只显示推送的文本，跳过生成时也要把已有大纲推送过去
+            if self.stream_callback:
+                self.stream_callback(outline)
+            return True, outline
+
         # 构建提示词
         prompt = self.build_prompt(plot_summaries)
 
-        try:
-            if not self.check_pause() or self.check_stop():
-                return False, None
-            response = self.api_handler.generate(prompt)
-        except Exception as e:
-            self.logger.error(f"大纲生成失败: {str(e)}")
+        if not self.check_pause() or self.check_stop():
             return False, None
 
-        # 保存结果
+        # 流式生成：增量文本边到达边写入临时文件并推送到界面，完整生成后才替换原大纲
         os.makedirs(os.path.dirname(outline_path), exist_ok=True)
-        with open(outline_path, 'w', encoding='utf-8') as f:
-            f.write(response)
+        tmp_path = outline_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                def on_chunk(text):
+                    if self.check_stop():
+                        raise GenerationCancelled("用户取消大纲生成")
+                    f.write(text)
+                    f.flush()
+                    if self.stream_callback:
+                        self.stream_callback(text)
+
+                response = self.api_handler.generate(prompt, stream_callback=on_chunk)
+        except GenerationCancelled:
+            self.logger.info("大纲生成已取消，保留原有大纲")
+            self._discard(tmp_path)
+            return False, None
+        except Exception as e:
+            self.logger.error(f"大纲生成失败，保留原有大纲: {str(e)}")
+            self._discard(tmp_path)
+            return False, None
 
+        os.replace(tmp_path, outline_path)
+        build_state.record('stage4', inputs)
         return True, response
 
+    @staticmethod
+    def _discard(path):
+        if os.path.exists(path):
+            os.remove(path)
+
     def build_prompt(self, plot_summaries):
         """构建全书大纲提示词"""
         climax_threshold = self.config.get('stage4', 'climax_threshold', '4')
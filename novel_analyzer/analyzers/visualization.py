@@ -1,11 +1,12 @@
 # analyzers/visualization.py
 import os
-import json
+import json_codec
 import networkx as nx
 import matplotlib.pyplot as plt
 import numpy as np
 from collections import defaultdict
 from config_manager import ConfigManager
+from build_state import BuildState, digest
 
 
 class StoryVisualizer:
@@ -20,8 +21,15 @@ class StoryVisualizer:
         if not os.path.exists(block_path):
             return False
 
-        with open(block_path, 'r', encoding='utf-8') as f:
-            block_data = json.load(f)
+        block_data = json_codec.read_json(block_path)
+
+        # 分块数据和布局都未变化时复用已有图像
+        layout_style = self.config.get('visualization', 'layout_style', 'circular')
+        graph_path = os.path.join(self.output_dir, 'story_graph.png')
+        build_state = BuildState.for_output_dir(self.output_dir)
+        inputs = {'blocks': digest(block_data['blocks']), 'config': digest(layout_style)}
+        if build_state.is_current('visualization', inputs, os.path.exists(graph_path)):
+            return True
 
         # 创建图结构
         G = nx.DiGraph()
@@ -62,7 +70,6 @@ class StoryVisualizer:
         plt.figure(figsize=(15, 10))
 
         # 根据配置选择布局
-        layout_style = self.config.get('visualization', 'layout_style', 'circular')
         if layout_style == 'circular':
             pos = nx.circular_layout(G)
         else:  # spring
@@ -81,9 +88,9 @@ class StoryVisualizer:
         plt.axis('off')
 
         # 保存图像
-        graph_path = os.path.join(self.output_dir, 'story_graph.png')
         plt.savefig(graph_path, dpi=300, bbox_inches='tight')
         plt.close()
+        build_state.record('visualization', inputs)
 
         return True
 
@@ -1,20 +1,63 @@
 # api_handler.py
 import time
+import json_codec
+import asyncio
 import requests
 import logging
+from requests.adapters import HTTPAdapter
 from http import HTTPStatus
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from config_manager import ConfigManager
 from api_rate_limiter import APIRateLimiter
+from response_cache import ResponseCache
+from token_budget import estimate_tokens, select_model, check_fits
+
+
+class GenerationCancelled(Exception):
+    """流式回调主动取消生成"""
+
+
+class StreamInterruptedError(Exception):
+    """流式输出已部分交付后连接中断，不能透明重试"""
+
+
+class APIStatusError(Exception):
+    """API返回了非限流的错误状态码"""
+
+    def __init__(self, status):
+        super().__init__(f"HTTP {int(status)}")
+        self.status = status
+
+
+def run_batch(generate, prompts, workers, logger):
+    """线程池并发调用 generate，结果与提示词一一对应，失败的为 None"""
+    total = len(prompts)
+    results = [None] * total
+    completed = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, total or 1))) as executor:
+        futures = {executor.submit(generate, prompt): index for index, prompt in enumerate(prompts)}
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                logger.error(f"API请求失败: {str(e)}")
+            completed += 1
+            logger.info(f"API请求完成: {completed}/{total}")
+    return results
 
 
 class APIHandler:
-    def __init__(self, config_manager):
+    def __init__(self, config_manager, engine=None, api_key=None, model=None):
         self.config = config_manager
-        self.engine = self.config.get('global', 'api_engine')
-        self.api_key = self.config.get('global', 'api_key')
+        self.engine = engine or self.config.get('global', 'api_engine')
+        self.api_key = api_key if api_key is not None else self.config.get('global', 'api_key')
+        self.model = model
         self.base_url = self._get_base_url()
         self.logger = logging.getLogger(__name__)
-        self.rate_limiter = APIRateLimiter(config_manager)
+        self.rate_limiter = APIRateLimiter(config_manager, self.engine)
+        self.timeout = self._get_timeout()
+        self.pool_size = self._get_pool_size()
+        self.session = self._create_session()
 
     def _get_base_url(self):
         if self.engine == 'DeepSeek':
@@ -24,62 +67,233 @@ class APIHandler:
         else:
             raise ValueError(f"Unsupported API engine: {self.engine}")
 
-    def generate(self, prompt, max_retries=5):
-        if not self.api_key:
-            raise ValueError("API密钥未配置")
+    def _get_timeout(self):
+        connect_timeout = float(self.config.get('global', 'connect_timeout', '10'))
+        read_timeout = float(self.config.get('global', 'read_timeout', '120'))
+        return connect_timeout, read_timeout
 
-        headers = {
+    def _get_pool_size(self):
+        return max(1, int(self.config.get('global', 'concurrency', '4')))
+
+    def _create_session(self):
+        """创建长连接会话，连接池大小与并发数一致"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=True)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update(self._get_headers())
+        return session
+
+    def _create_async_session(self, concurrency=None):
+        """创建异步会话，连接数上限与并发数一致"""
+        # aiohttp 只有异步路径需要，按需导入，未安装时同步 generate 不受影响
+        import aiohttp
+        limit = concurrency or max(1, int(self.config.get('global', 'concurrency', '4')))
+        connect_timeout, read_timeout = self.timeout
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=limit),
+            timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout),
+            headers=self._get_headers()
+        )
+
+    def _get_headers(self):
+        return {
             "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
+            "Authorization": f"Bearer {self.api_key}",
+            "Connection": "keep-alive"
         }
 
-        payload = {
-            "model": "deepseek-chat" if self.engine == "DeepSeek" else "moonshot-v1-32k",
+    def _build_payload(self, prompt):
+        """构建请求体；未指定模型时按提示词长度选择最小够用的模型，放不下则直接拒绝"""
+        max_tokens = 4000
+        prompt_tokens = estimate_tokens(prompt)
+        if self.model:
+            check_fits(self.engine, self.model, prompt_tokens, max_tokens)
+            model = self.model
+        else:
+            model = select_model(self.engine, prompt_tokens, max_tokens)
+        return {
+            "model": model,
             "messages": [{"role": "user", "content": prompt}],
             "temperature": 0.3,
-            "max_tokens": 4000
+            "max_tokens": max_tokens
         }
 
+    def _cache_lookup(self, payload, use_cache):
+        """返回 (缓存实例, 键, 命中内容)；缓存关闭时全部为 None"""
+        cache = ResponseCache.for_config(self.config) if use_cache else None
+        if cache is None:
+            return None, None, None
+        key = ResponseCache.make_key(
+            self.engine, payload['model'], payload['temperature'],
+            payload['max_tokens'], payload['messages'][-1]['content']
+        )
+        return cache, key, cache.get(key)
+
+    def get_headroom(self):
+        return self.rate_limiter.get_headroom()
+
+    def get_cache_stats(self):
+        cache = ResponseCache.for_config(self.config)
+        return cache.stats() if cache else None
+
+    @staticmethod
+    def _estimate_tokens(payload):
+        """本次请求预计消耗的token（提示词部分）"""
+        return sum(estimate_tokens(message['content']) for message in payload['messages'])
+
+    @staticmethod
+    def _extract_content(result):
+        return result['choices'][0]['message']['content']
+
+    @staticmethod
+    def _read_stream(response, stream_callback):
+        """逐行解析SSE响应，每段增量文本到达即回调"""
+        parts = []
+        response.encoding = 'utf-8'
+        with response:
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith('data:'):
+                        continue
+                    data = line[5:].strip()
+                    if data == '[DONE]':
+                        break
+                    delta = json_codec.loads(data)['choices'][0].get('delta', {}).get('content')
+                    if delta:
+                        parts.append(delta)
+                        stream_callback(delta)
+            except GenerationCancelled:
+                raise
+            except Exception as e:
+                if parts:
+                    raise StreamInterruptedError(f"流式输出中断: {str(e)}") from e
+                raise
+        return ''.join(parts)
+
+    def reload_connection_settings(self):
+        """全局设置保存后调用：并发数或超时变化时换用新会话，限流器状态保留"""
+        timeout, pool_size = self._get_timeout(), self._get_pool_size()
+        if timeout == self.timeout and pool_size == self.pool_size:
+            return
+        self.timeout, self.pool_size = timeout, pool_size
+        # 旧会话可能仍有请求在途，不主动关闭，释放引用后随连接归还回收
+        self.session = self._create_session()
+        self.logger.info(f"API连接设置已更新: 连接池 {pool_size}，超时 {timeout}")
+
+    def close(self):
+        self.session.close()
+
+    def _prepare(self, prompt, use_cache):
+        """同步/异步路径共用：构建请求体并查缓存，返回 (请求体, 缓存实例, 键, 命中内容)"""
+        payload = self._build_payload(prompt)
+        cache, cache_key, cached = self._cache_lookup(payload, use_cache)
+        if cached is None and not self.api_key:
+            raise ValueError("API密钥未配置")
+        return payload, cache, cache_key, cached
+
+    def _check_status(self, status, headers):
+        """记录响应状态：限流返回 False 表示本次不计入重试直接重发，其余错误状态抛出 APIStatusError"""
+        if status == HTTPStatus.TOO_MANY_REQUESTS:
+            self.rate_limiter.record_throttle(headers)
+            return False
+        if status >= HTTPStatus.BAD_REQUEST:
+            raise APIStatusError(status)
+        self.rate_limiter.record_success(headers)
+        return True
+
+    def _retry_delay(self, attempt, max_retries, error):
+        """记录失败并返回退避秒数：HTTP错误最长等60秒，其余错误最长30秒"""
+        if isinstance(error, APIStatusError):
+            self.logger.error(f"HTTP错误 (尝试 {attempt + 1}/{max_retries}): {str(error)}")
+            return min(2 ** attempt, 60)
+        self.logger.error(f"API调用失败 (尝试 {attempt + 1}/{max_retries}): {str(error)}")
+        return min(2 ** attempt, 30)
+
+    @staticmethod
+    def _store(cache, cache_key, content):
+        if cache is not None:
+            cache.put(cache_key, content)
+        return content
+
+    def generate(self, prompt, max_retries=5, use_cache=True, stream_callback=None):
+        """stream_callback 不为空时以SSE流式请求，增量文本逐段回调；回调抛出 GenerationCancelled 可中止生成"""
+        payload, cache, cache_key, cached = self._prepare(prompt, use_cache)
+        if cached is not None:
+            if stream_callback is not None:
+                stream_callback(cached)
+            return cached
+
+        stream = stream_callback is not None
+        if stream:
+            payload = dict(payload, stream=True)
+
         for attempt in range(max_retries):
             try:
-                self.rate_limiter.wait_if_needed()
-                response = requests.post(self.base_url, json=payload, headers=headers, timeout=120)
-
-                if response.status_code == HTTPStatus.TOO_MANY_REQUESTS:
-                    retry_after = response.headers.get('Retry-After', 30)
-                    wait_time = max(int(retry_after), 30)
-                    self.logger.warning(f"API限流，等待 {wait_time} 秒后重试...")
-                    time.sleep(wait_time)
+                self.rate_limiter.wait_if_needed(self._estimate_tokens(payload))
+                response = self.session.post(self.base_url, json=payload, timeout=self.timeout, stream=stream)
+                if response.status_code >= HTTPStatus.BAD_REQUEST:
+                    # 流式请求的响应体未读取，先归还连接
+                    response.close()
+                if not self._check_status(response.status_code, response.headers):
                     continue
+                if stream:
+                    content = self._read_stream(response, stream_callback)
+                else:
+                    content = self._extract_content(response.json())
+                return self._store(cache, cache_key, content)
+            except (GenerationCancelled, StreamInterruptedError):
+                raise
+            except Exception as e:
+                time.sleep(self._retry_delay(attempt, max_retries, e))
 
-                response.raise_for_status()
-                result = response.json()
-                return result['choices'][0]['message']['content']
+        raise Exception(f"API调用失败，已达最大重试次数 {max_retries}")
 
-            except requests.exceptions.HTTPError as e:
-                if e.response.status_code == HTTPStatus.TOO_MANY_REQUESTS:
-                    continue
-                wait_time = min(2 ** attempt, 60)
-                self.logger.error(f"HTTP错误 (尝试 {attempt + 1}/{max_retries}): {str(e)}")
-                time.sleep(wait_time)
+    async def agenerate(self, prompt, max_retries=5, session=None, use_cache=True):
+        """异步生成，session 为空时临时创建会话；重试、限流和缓存逻辑与 generate 共用"""
+        payload, cache, cache_key, cached = self._prepare(prompt, use_cache)
+        if cached is not None:
+            return cached
+
+        if session is None:
+            async with self._create_async_session() as session:
+                return await self.agenerate(prompt, max_retries, session, use_cache)
+
+        for attempt in range(max_retries):
+            try:
+                await self.rate_limiter.async_wait_if_needed(self._estimate_tokens(payload))
+                async with session.post(self.base_url, json=payload) as response:
+                    if not self._check_status(response.status, response.headers):
+                        continue
+                    content = self._extract_content(await response.json(content_type=None))
+                return self._store(cache, cache_key, content)
             except Exception as e:
-                wait_time = min(2 ** attempt, 30)
-                self.logger.error(f"API调用失败 (尝试 {attempt + 1}/{max_retries}): {str(e)}")
-                time.sleep(wait_time)
+                await asyncio.sleep(self._retry_delay(attempt, max_retries, e))
 
         raise Exception(f"API调用失败，已达最大重试次数 {max_retries}")
 
-    def batch_generate(self, prompts, batch_size=5):
-        results = []
+    async def abatch_generate(self, prompts, concurrency=None):
+        """并发生成，信号量控制在途请求数，失败的提示词结果为 None"""
+        concurrency = concurrency or max(1, int(self.config.get('global', 'concurrency', '4')))
+        semaphore = asyncio.Semaphore(concurrency)
         total = len(prompts)
-        for i in range(0, total, batch_size):
-            batch = prompts[i:i + batch_size]
-            for j, prompt in enumerate(batch):
-                try:
-                    results.append(self.generate(prompt))
-                    self.logger.info(f"API请求完成: {i + j + 1}/{total}")
-                except Exception as e:
-                    self.logger.error(f"API请求失败: {str(e)}")
-                    results.append(None)
-            time.sleep(1)
-        return results
\ No newline at end of file
+        completed = 0
+
+        async with self._create_async_session(concurrency) as session:
+            async def run_one(prompt):
+                nonlocal completed
+                async with semaphore:
+                    try:
+                        result = await self.agenerate(prompt, session=session)
+                    except Exception as e:
+                        self.logger.error(f"API请求失败: {str(e)}")
+                        result = None
+                completed += 1
+                self.logger.info(f"API请求完成: {completed}/{total}")
+                return result
+
+            return list(await asyncio.gather(*(run_one(prompt) for prompt in prompts)))
+
+    def batch_generate(self, prompts, batch_size=5):
+        """同步批量生成，走 requests 长连接会话，不依赖 aiohttp"""
+        return run_batch(self.generate, prompts, batch_size, self.logger)
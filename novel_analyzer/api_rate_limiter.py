@@ -1,36 +1,211 @@
 # api_rate_limiter.py
+import re
 import time
+import asyncio
 import logging
-from collections import deque
 import threading
+from email.utils import parsedate_to_datetime
+
+
+class TokenBucket:
+    """令牌桶：允许欠账预约，每次预约 O(1)"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_time = time.monotonic()
+
+    def configure(self, rate, capacity):
+        if rate != self.rate or capacity != self.capacity:
+            self.rate = rate
+            self.capacity = capacity
+            self.tokens = min(self.tokens, capacity)
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_time) * self.rate)
+        self.last_time = now
+
+    def reserve(self, amount, now):
+        """扣除令牌（可为负），返回令牌补足所需的等待秒数"""
+        self.refill(now)
+        self.tokens -= amount
+        return max(0.0, -self.tokens / self.rate)
+
+
+class AdaptiveRateController:
+    """AIMD速率控制：限流时乘性减半，连续成功时加性探测，向账户真实上限收敛"""
+
+    def __init__(self, seed_rpm, ceiling=None, floor=1.0, decrease_factor=0.5):
+        self.seed_rpm = seed_rpm
+        self.current_rpm = float(seed_rpm)
+        self.ceiling = float(ceiling or seed_rpm * 4)
+        self.floor = floor
+        self.decrease_factor = decrease_factor
+        self.success_streak = 0
+
+    def on_success(self, provider_limit=None):
+        """成功一次；当前速率下约一分钟无限流时，速率加1"""
+        if provider_limit:
+            self.ceiling = float(provider_limit)
+        self.success_streak += 1
+        if self.success_streak >= self.current_rpm:
+            self.success_streak = 0
+            self.current_rpm = min(self.ceiling, self.current_rpm + 1)
+        self.current_rpm = min(self.current_rpm, self.ceiling)
+        return self.current_rpm
+
+    def on_throttle(self):
+        self.success_streak = 0
+        self.current_rpm = max(self.floor, self.current_rpm * self.decrease_factor)
+        return self.current_rpm
+
+
+def parse_wait_seconds(value):
+    """解析 Retry-After / x-ratelimit-reset-* 头：秒数、'6m0s' 形式或HTTP日期"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value)
+    if parts and ''.join(number + unit for number, unit in parts) == value:
+        scale = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+        return sum(float(number) * scale[unit] for number, unit in parts)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
 
 
 class APIRateLimiter:
-    def __init__(self, config_manager):
+    def __init__(self, config_manager, engine=None):
         self.config = config_manager
+        self.engine = engine
         self.logger = logging.getLogger(__name__)
         self.lock = threading.Lock()
-        self.call_history = deque()
         self.api_limits = {
             "DeepSeek": {"free": 3, "paid": 60},
             "Kimi": {"free": 5, "paid": 60}
         }
+        self.request_bucket = None
+        self.token_bucket = None
+        self.controller = None
+        self.blocked_until = 0.0
 
-    def get_rate_limit(self):
-        engine = self.config.get('global', 'api_engine', 'DeepSeek')
+    def get_seed_rate_limit(self):
+        """套餐的初始RPM，仅作为自适应控制的起点"""
+        engine = self.engine or self.config.get('global', 'api_engine', 'DeepSeek')
         plan = self.config.get('global', 'api_plan', 'free')
         return self.api_limits.get(engine, {}).get(plan, 3)
 
-    def wait_if_needed(self):
+    def get_rate_limit(self):
+        seed_rpm = self.get_seed_rate_limit()
+        if self.controller is None or self.controller.seed_rpm != seed_rpm:
+            ceiling = float(self.config.get('global', 'api_rpm_ceiling', '0') or 0)
+            self.controller = AdaptiveRateController(seed_rpm, ceiling=ceiling or None)
+        return self.controller.current_rpm
+
+    def get_token_limit(self):
+        """每分钟token上限，0 表示不限"""
+        return int(self.config.get('global', 'api_tpm', '0') or 0)
+
+    def get_burst(self, rate_limit):
+        burst = int(self.config.get('global', 'api_burst', '0') or 0)
+        return burst if burst > 0 else max(1, min(int(rate_limit), 10))
+
+    def _sync_buckets(self):
+        """按当前配置更新桶参数，套餐切换后立即生效"""
+        rate_limit = self.get_rate_limit()
+        burst = self.get_burst(rate_limit)
+        if self.request_bucket is None:
+            self.request_bucket = TokenBucket(rate_limit / 60, burst)
+        else:
+            self.request_bucket.configure(rate_limit / 60, burst)
+
+        token_limit = self.get_token_limit()
+        if token_limit <= 0:
+            self.token_bucket = None
+        elif self.token_bucket is None:
+            self.token_bucket = TokenBucket(token_limit / 60, token_limit)
+        else:
+            self.token_bucket.configure(token_limit / 60, token_limit)
+
+    def reserve(self, tokens=0):
+        """在锁内预约请求与token配额，返回需要等待的秒数（等待在锁外进行）"""
+        with self.lock:
+            self._sync_buckets()
+            now = time.monotonic()
+            wait_time = self.request_bucket.reserve(1, now)
+            if self.token_bucket is not None and tokens:
+                wait_time = max(wait_time, self.token_bucket.reserve(tokens, now))
+            return max(wait_time, self.blocked_until - now)
+
+    def record_success(self, headers=None):
+        """请求成功：读取服务商限流头并加性提升速率"""
+        headers = headers or {}
+        with self.lock:
+            self.get_rate_limit()
+            provider_limit = headers.get('x-ratelimit-limit-requests')
+            try:
+                provider_limit = float(provider_limit) if provider_limit else None
+            except ValueError:
+                provider_limit = None
+            self.controller.on_success(provider_limit)
+
+            remaining = headers.get('x-ratelimit-remaining-requests')
+            reset_seconds = parse_wait_seconds(headers.get('x-ratelimit-reset-requests'))
+            if remaining is not None and reset_seconds and str(remaining).strip() == '0':
+                self.blocked_until = max(self.blocked_until, time.monotonic() + reset_seconds)
+
+    def record_throttle(self, headers=None):
+        """收到429：速率减半，并按 Retry-After 暂停发放配额，返回建议等待秒数"""
+        headers = headers or {}
+        retry_after = parse_wait_seconds(headers.get('Retry-After'))
+        if retry_after is None:
+            retry_after = parse_wait_seconds(headers.get('x-ratelimit-reset-requests'))
+        with self.lock:
+            self.get_rate_limit()
+            new_rpm = self.controller.on_throttle()
+            now = time.monotonic()
+            if self.request_bucket is not None:
+                self.request_bucket.refill(now)
+                self.request_bucket.tokens = min(self.request_bucket.tokens, 0.0)
+            wait_time = retry_after if retry_after is not None else 60 / new_rpm
+            self.blocked_until = max(self.blocked_until, now + wait_time)
+        self.logger.warning(f"API限流，速率下调至 {new_rpm:.1f} RPM，{wait_time:.1f} 秒后恢复")
+        return wait_time
+
+    def wait_if_needed(self, tokens=0):
+        wait_time = self.reserve(tokens)
+        if wait_time > 0:
+            self.logger.warning(f"API速率限制，等待 {wait_time:.1f} 秒...")
+            time.sleep(wait_time)
+
+    async def async_wait_if_needed(self, tokens=0):
+        wait_time = self.reserve(tokens)
+        if wait_time > 0:
+            self.logger.warning(f"API速率限制，等待 {wait_time:.1f} 秒...")
+            await asyncio.sleep(wait_time)
+
+    def get_headroom(self):
+        """返回当前剩余配额，供界面显示"""
         with self.lock:
-            current_time = time.time()
-            rate_limit = self.get_rate_limit()
-            while self.call_history and current_time - self.call_history[0] > 60:
-                self.call_history.popleft()
-            if len(self.call_history) >= rate_limit:
-                oldest_call = self.call_history[0]
-                wait_time = 60 - (current_time - oldest_call) + 1
-                self.logger.warning(f"API速率限制，等待 {wait_time:.1f} 秒...")
-                time.sleep(wait_time)
-                current_time = time.time()
-            self.call_history.append(current_time)
\ No newline at end of file
+            self._sync_buckets()
+            now = time.monotonic()
+            self.request_bucket.refill(now)
+            headroom = {
+                'rpm': self.get_rate_limit(),
+                'requests_available': max(0.0, self.request_bucket.tokens),
+                'request_capacity': self.request_bucket.capacity,
+                'tpm': 0,
+                'tokens_available': None
+            }
+            if self.token_bucket is not None:
+                self.token_bucket.refill(now)
+                headroom['tpm'] = self.get_token_limit()
+                headroom['tokens_available'] = max(0.0, self.token_bucket.tokens)
+        headroom['fill'] = headroom['requests_available'] / headroom['request_capacity']
+        return headroom
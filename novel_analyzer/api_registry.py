@@ -0,0 +1,74 @@
+import threading
+import logging
+from api_handler import APIHandler
+from api_router import APIRouter, parse_backends
+
+
+class APIClientRegistry:
+    """进程级API客户端注册表：每个 (引擎, 密钥, 模型) 只有一个客户端、一个限流器"""
+    _lock = threading.RLock()
+    _clients = {}
+    logger = logging.getLogger(__name__)
+
+    @classmethod
+    def get_client(cls, config_manager, engine=None, api_key=None, model=None):
+        """未指定后端且配置了密钥池时返回负载均衡路由器，否则返回单一客户端"""
+        if engine is None and api_key is None:
+            backends_text = config_manager.get('global', 'api_backends', '')
+            if parse_backends(backends_text):
+                return cls._get_router(config_manager, backends_text)
+
+        engine = engine or config_manager.get('global', 'api_engine')
+        if api_key is None:
+            api_key = config_manager.get('global', 'api_key')
+        key = (engine, api_key, model)
+        with cls._lock:
+            client = cls._clients.get(key)
+            if client is None:
+                client = APIHandler(config_manager, engine=engine, api_key=api_key, model=model)
+                cls._clients[key] = client
+                cls.logger.info(f"创建共享API客户端: {engine}")
+            return client
+
+    @classmethod
+    def peek(cls, config_manager):
+        """只读查找：返回当前配置对应且已创建的客户端，没有则返回 None，不创建也不解析密钥池"""
+        backends_text = config_manager.get('global', 'api_backends', '')
+        with cls._lock:
+            router = cls._clients.get(('router', backends_text))
+            if router is not None:
+                return router
+            key = (config_manager.get('global', 'api_engine'), config_manager.get('global', 'api_key'), None)
+            return cls._clients.get(key)
+
+    @classmethod
+    def _get_router(cls, config_manager, backends_text):
+        key = ('router', backends_text)
+        with cls._lock:
+            router = cls._clients.get(key)
+            if router is None:
+                handlers = [
+                    (cls.get_client(config_manager, engine=engine, api_key=api_key, model=model), weight)
+                    for engine, api_key, model, weight in parse_backends(backends_text)
+                ]
+                cooldown = float(config_manager.get('global', 'api_backend_cooldown', '60'))
+                router = APIRouter(config_manager, handlers, cooldown=cooldown)
+                cls._clients[key] = router
+                cls.logger.info(f"创建负载均衡路由: {len(handlers)} 个后端")
+            return router
+
+    @classmethod
+    def reload_settings(cls):
+        """让已创建的客户端按最新配置重建连接池与超时，不丢弃限流状态"""
+        with cls._lock:
+            for key, client in cls._clients.items():
+                if key[0] != 'router':
+                    client.reload_connection_settings()
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            for key, client in cls._clients.items():
+                if key[0] != 'router':
+                    client.close()
+            cls._clients.clear()
@@ -0,0 +1,207 @@
+import time
+import asyncio
+import logging
+import threading
+from api_handler import GenerationCancelled, StreamInterruptedError, run_batch
+from token_budget import PromptTooLongError
+
+logger = logging.getLogger(__name__)
+
+
+def parse_backends(text):
+    """解析密钥池配置，每行: 引擎|密钥|模型|权重（模型、权重可省略）"""
+    backends = []
+    for line_no, line in enumerate((text or '').splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        parts = [part.strip() for part in line.split('|')]
+        if len(parts) < 2 or not parts[0] or not parts[1]:
+            logger.warning(f"忽略无效的密钥池配置: 第{line_no}行")
+            continue
+        model = parts[2] if len(parts) > 2 and parts[2] else None
+        try:
+            weight = float(parts[3]) if len(parts) > 3 and parts[3] else 1.0
+        except ValueError:
+            weight = 1.0
+        backends.append((parts[0], parts[1], model, max(weight, 0.1)))
+    return backends
+
+
+class APIBackend:
+    def __init__(self, handler, weight=1.0):
+        self.handler = handler
+        self.weight = weight
+        self.current_weight = 0.0
+        self.in_flight = 0
+        self.unhealthy_until = 0.0
+
+    @property
+    def name(self):
+        return f"{self.handler.engine}:***{self.handler.api_key[-4:]}:{self.handler.model or '默认模型'}"
+
+    def is_healthy(self, now):
+        return self.unhealthy_until <= now
+
+
+class APIRouter:
+    """按权重在多个 (引擎, 密钥, 模型) 后端间分发请求，故障后端冷却后再启用"""
+
+    def __init__(self, config_manager, handlers_with_weights, cooldown=60, backend_retries=2):
+        self.config = config_manager
+        self.backends = [APIBackend(handler, weight) for handler, weight in handlers_with_weights]
+        self.cooldown = cooldown
+        self.backend_retries = backend_retries
+        self.lock = threading.Lock()
+
+    def _acquire(self, tried):
+        """平滑加权轮询选择健康后端；全部不健康时选最早恢复的"""
+        with self.lock:
+            now = time.monotonic()
+            candidates = [b for b in self.backends if b not in tried and b.is_healthy(now)]
+            if not candidates:
+                candidates = sorted(
+                    (b for b in self.backends if b not in tried),
+                    key=lambda b: b.unhealthy_until
+                )[:1]
+            if not candidates:
+                return None
+            total_weight = sum(b.weight for b in candidates)
+            for backend in candidates:
+                backend.current_weight += backend.weight
+            chosen = max(candidates, key=lambda b: b.current_weight)
+            chosen.current_weight -= total_weight
+            chosen.in_flight += 1
+            return chosen
+
+    def _release(self, backend, error=None):
+        with self.lock:
+            backend.in_flight -= 1
+            if error is None:
+                backend.unhealthy_until = 0.0
+                return
+            backend.unhealthy_until = time.monotonic() + self.cooldown
+        logger.warning(f"后端 {backend.name} 调用失败，冷却 {self.cooldown} 秒: {str(error)}")
+
+    def generate(self, prompt, max_retries=5, use_cache=True, stream_callback=None):
+        tried = set()
+        last_error = None
+        too_long = []
+        for attempt in range(max_retries):
+            backend = self._acquire(tried)
+            if backend is None:
+                tried.clear()
+                continue
+            try:
+                result = backend.handler.generate(
+                    prompt, max_retries=self.backend_retries,
+                    use_cache=use_cache, stream_callback=stream_callback
+                )
+            except (GenerationCancelled, StreamInterruptedError):
+                self._release(backend)
+                raise
+            except PromptTooLongError:
+                # 上下文不足不是后端故障，换更大窗口的后端，全部放不下则拒绝
+                self._release(backend)
+                too_long.append(backend)
+                if len(set(too_long)) >= len(self.backends):
+                    raise
+                tried.add(backend)
+                continue
+            except Exception as e:
+                self._release(backend, e)
+                tried.add(backend)
+                if len(tried) >= len(self.backends):
+                    tried.clear()
+                last_error = e
+                continue
+            self._release(backend)
+            return result
+        raise Exception(f"所有后端调用失败，已达最大重试次数 {max_retries}: {str(last_error)}")
+
+    async def agenerate(self, prompt, max_retries=5, sessions=None, use_cache=True):
+        """sessions 为 {后端: 会话}，为空时每次临时创建会话"""
+        tried = set()
+        last_error = None
+        too_long = []
+        for attempt in range(max_retries):
+            backend = self._acquire(tried)
+            if backend is None:
+                tried.clear()
+                continue
+            session = sessions.get(backend) if sessions else None
+            try:
+                result = await backend.handler.agenerate(
+                    prompt, max_retries=self.backend_retries, session=session, use_cache=use_cache
+                )
+            except PromptTooLongError:
+                self._release(backend)
+                too_long.append(backend)
+                if len(set(too_long)) >= len(self.backends):
+                    raise
+                tried.add(backend)
+                continue
+            except Exception as e:
+                self._release(backend, e)
+                tried.add(backend)
+                if len(tried) >= len(self.backends):
+                    tried.clear()
+                last_error = e
+                continue
+            self._release(backend)
+            return result
+        raise Exception(f"所有后端调用失败，已达最大重试次数 {max_retries}: {str(last_error)}")
+
+    async def abatch_generate(self, prompts, concurrency=None):
+        concurrency = concurrency or max(1, int(self.config.get('global', 'concurrency', '4')))
+        semaphore = asyncio.Semaphore(concurrency)
+        total = len(prompts)
+        completed = 0
+        sessions = {backend: backend.handler._create_async_session(concurrency) for backend in self.backends}
+
+        async def run_one(prompt):
+            nonlocal completed
+            async with semaphore:
+                try:
+                    result = await self.agenerate(prompt, sessions=sessions)
+                except Exception as e:
+                    logger.error(f"API请求失败: {str(e)}")
+                    result = None
+            completed += 1
+            logger.info(f"API请求完成: {completed}/{total}")
+            return result
+
+        try:
+            return list(await asyncio.gather(*(run_one(prompt) for prompt in prompts)))
+        finally:
+            for session in sessions.values():
+                await session.close()
+
+    def batch_generate(self, prompts, batch_size=5):
+        """同步批量生成，各后端走 requests 长连接会话，不依赖 aiohttp"""
+        return run_batch(self.generate, prompts, batch_size, logger)
+
+    def get_cache_stats(self):
+        return self.backends[0].handler.get_cache_stats()
+
+    def get_headroom(self):
+        """汇总各健康后端的剩余配额"""
+        now = time.monotonic()
+        healthy = [b for b in self.backends if b.is_healthy(now)] or self.backends
+        headrooms = [b.handler.get_headroom() for b in healthy]
+        headroom = {
+            'rpm': sum(h['rpm'] for h in headrooms),
+            'requests_available': sum(h['requests_available'] for h in headrooms),
+            'request_capacity': sum(h['request_capacity'] for h in headrooms),
+            'tpm': sum(h['tpm'] for h in headrooms),
+            'tokens_available': None
+        }
+        token_levels = [h['tokens_available'] for h in headrooms if h['tokens_available'] is not None]
+        if token_levels:
+            headroom['tokens_available'] = sum(token_levels)
+        headroom['fill'] = headroom['requests_available'] / headroom['request_capacity']
+        return headroom
+
+    def close(self):
+        for backend in self.backends:
+            backend.handler.close()
@@ -0,0 +1,141 @@
+# benchmarks/bench_block_rules.py
+"""阶段二分块规则基准：原先逐块 extend/sort 的列表实现与起点数组向量化实现对比
+
+用法（在 novel_analyzer 目录下）:
+    python benchmarks/bench_block_rules.py --chapters 20000
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_manager import ConfigManager
+from analyzers.stage2_block_analyzer import Stage2BlockAnalyzer
+
+
+def make_summaries(count, seed=42):
+    """合成转折分序列：大部分章节 1-2 分，夹杂成段的低分平台和零星高分转折"""
+    rng = random.Random(seed)
+    summaries = []
+    chapter = 0
+    while chapter < count:
+        flat = rng.random() < 0.3
+        for _ in range(rng.randint(3, 40)):
+            chapter += 1
+            if flat:
+                score = 1
+            else:
+                score = rng.choices([1, 2, 3, 4, 5], weights=[40, 30, 15, 10, 5])[0]
+            summaries.append({'chapter': chapter, 'summary': [f"第{chapter}章事件"], 'turning_score': score})
+    return summaries[:count]
+
+
+def legacy_apply_block_rules(clusters, summaries):
+    """原实现（去掉冲突识别）：合并时 extend 后整体 sort，并重建转折点集合"""
+    chapter_map = {s['chapter']: s for s in summaries}
+
+    def finalize(chapters):
+        return {
+            'chapters': sorted(chapters),
+            'turning_points': [ch for ch in chapters if chapter_map[ch]['turning_score'] >= 3]
+        }
+
+    def merge_into(prev_block, block):
+        prev_block['chapters'].extend(block['chapters'])
+        prev_block['chapters'].sort()
+        prev_turning_points = set(prev_block.get('turning_points', []))
+        prev_turning_points.update(block.get('turning_points', []))
+        prev_block['turning_points'] = sorted(prev_turning_points)
+
+    blocks = []
+    current_block = []
+    for cluster in clusters:
+        if any(chapter_map[ch]['turning_score'] >= 4 for ch in cluster) or len(cluster) >= 25:
+            if current_block:
+                blocks.append(finalize(current_block))
+            current_block = list(cluster)
+        else:
+            current_block.extend(cluster)
+    if current_block:
+        blocks.append(finalize(current_block))
+
+    merged_blocks = []
+    for block in blocks:
+        low_score_chapters = [ch for ch in block['chapters'] if chapter_map[ch]['turning_score'] <= 1]
+        if merged_blocks and len(low_score_chapters) >= 5:
+            merge_into(merged_blocks[-1], block)
+        else:
+            merged_blocks.append(block)
+
+    final_blocks = []
+    for i, block in enumerate(merged_blocks):
+        if not any(chapter_map[ch]['turning_score'] >= 3 for ch in block['chapters']):
+            if i > 0:
+                merge_into(final_blocks[-1], block)
+            else:
+                block['alert'] = "缺乏高分转折章节"
+                final_blocks.append(block)
+        else:
+            final_blocks.append(block)
+    return final_blocks
+
+
+def make_plateau_summaries(count):
+    """最坏情况：每 6 章一个高分转折后跟 5 个低分章节，每块都会被规则2并入同一个前块"""
+    pattern = [4, 1, 1, 1, 1, 1]
+    return [{'chapter': i + 1, 'summary': [f"第{i + 1}章事件"], 'turning_score': pattern[i % 6]}
+            for i in range(count)]
+
+
+def fixed_clusters(summaries, size):
+    chapters = [s['chapter'] for s in summaries]
+    return [chapters[i:i + size] for i in range(0, len(chapters), size)]
+
+
+def shape(blocks):
+    return [(b['chapters'], b['turning_points'], b.get('alert')) for b in blocks]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="阶段二分块规则基准")
+    parser.add_argument('--chapters', type=int, default=20000, help="合成章节数")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    summaries = make_summaries(args.chapters)
+    with tempfile.TemporaryDirectory() as tmp:
+        analyzer = Stage2BlockAnalyzer(ConfigManager(os.path.join(tmp, 'config.ini')))
+        segment_time, segmented = timed(analyzer._pre_cluster, summaries)
+        print(f"章节数: {len(summaries)}, 变点分段 {segment_time:.3f}s 得到 {len(segmented)} 段")
+
+        plateau = make_plateau_summaries(args.chapters)
+        cases = [
+            ('变点分段', summaries, segmented),
+            ('每2章一组', summaries, fixed_clusters(summaries, 2)),
+            ('每章一组', summaries, fixed_clusters(summaries, 1)),
+            ('低分平台', plateau, fixed_clusters(plateau, 6)),
+        ]
+        for name, series, clusters in cases:
+            legacy_time, expected = timed(legacy_apply_block_rules, [list(c) for c in clusters], series)
+            vector_time, actual = timed(analyzer._apply_block_rules, clusters, series)
+            if shape(actual) != shape(expected):
+                print(f"错误: {name} 两种实现的分块结果不一致")
+                return 1
+            print(f"{name:<8} {len(clusters):>6} 组 → {len(actual):>5} 块  "
+                  f"列表实现 {legacy_time:.3f}s, 向量化 {vector_time:.3f}s (加速 {legacy_time / vector_time:.1f}x)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+# benchmarks/bench_chapter_split.py
+"""章节标题识别微基准：逐行 strip/match/join 与 ChapterScanner 整块 finditer + 切片对比
+
+用法（在 novel_analyzer 目录下）:
+    python benchmarks/bench_chapter_split.py --size-mb 50
+"""
+import os
+import re
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chapter_scanner import ChapterScanner
+from file_processor import FileProcessor
+
+DEFAULT_REGEX = r'第[零一二三四五六七八九十百千0-9]+章'
+PARAGRAPHS = [
+    '　　他抬起头，望着远处的山峰，心中暗暗下定了决心。',
+    '　　“你真的要去吗？”她低声问道，声音里带着几分担忧。',
+    '　　夜色渐深，城中灯火一盏盏亮起，街上的行人却越来越少。',
+    '　　这一战之后，整个宗门都知道了这个名字。',
+    '',
+]
+
+
+def make_novel(size_mb, seed=42):
+    """生成指定大小的合成小说文本：每章约 3000 字，段落间夹杂空行"""
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    parts = ['简介：这是一本用于基准测试的小说。\n\n']
+    size = 0
+    num = 0
+    while size < target:
+        num += 1
+        lines = [f'第{num}章 风起云涌{num % 13}']
+        lines.extend(rng.choice(PARAGRAPHS) for _ in range(rng.randint(80, 140)))
+        chapter = '\n'.join(lines) + '\n'
+        parts.append(chapter)
+        size += len(chapter.encode('utf-8'))
+    return ''.join(parts)
+
+
+def split_by_lines(text, chapter_regex):
+    """原实现：逐行 strip + match，非空行追加到列表后 join"""
+    pattern = re.compile(chapter_regex)
+    chapters = []
+    current_chapter = []
+    chapter_title = ""
+    for line in text.split('\n'):
+        stripped = line.strip()
+        if pattern.match(stripped):
+            if chapter_title:
+                chapters.append((chapter_title, '\n'.join(current_chapter).strip()))
+            chapter_title = stripped
+            current_chapter = []
+        elif chapter_title and stripped:
+            current_chapter.append(line)
+    if chapter_title:
+        chapters.append((chapter_title, '\n'.join(current_chapter).strip()))
+    return chapters
+
+
+def split_by_scanner(text, chapter_regex):
+    """新实现：一次多行扫描定位标题，章节正文按切片截取"""
+    scanner = ChapterScanner(chapter_regex)
+    chapters = []
+    chapter_title = ""
+    body_start = 0
+    for line_start, next_body, title in scanner.iter_titles(text):
+        if chapter_title:
+            chapters.append((chapter_title, ChapterScanner.clean_content(text[body_start:line_start])))
+        chapter_title = title
+        body_start = next_body
+    if chapter_title:
+        chapters.append((chapter_title, ChapterScanner.clean_content(text[body_start:])))
+    return chapters
+
+
+def best_of(func, repeat, *args):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="章节标题识别微基准")
+    parser.add_argument('--size-mb', type=int, default=50, help="合成小说大小 (MB)")
+    parser.add_argument('--repeat', type=int, default=3, help="每种实现重复次数，取最快一次")
+    parser.add_argument('--regex', default=DEFAULT_REGEX, help="章节标题正则")
+    args = parser.parse_args()
+
+    text = make_novel(args.size_mb)
+    print(f"合成文本: {len(text.encode('utf-8')) / 1048576:.1f} MB, {len(text)} 字符")
+
+    line_time, expected = best_of(split_by_lines, args.repeat, text, args.regex)
+    scan_time, actual = best_of(split_by_scanner, args.repeat, text, args.regex)
+    if actual != expected:
+        print("错误: 两种实现的分割结果不一致")
+        return 1
+    print(f"章节数: {len(expected)}")
+    print(f"逐行匹配:      {line_time:.3f}s")
+    print(f"整块扫描+切片: {scan_time:.3f}s  (加速 {line_time / scan_time:.1f}x)")
+
+    # 端到端：含块解码、字节偏移换算与打包写出
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as tmp:
+        novel_path = os.path.join(tmp, 'novel.txt')
+        with open(novel_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        start = time.perf_counter()
+        chapters = FileProcessor.split_chapters(novel_path, os.path.join(tmp, 'out'), args.regex,
+                                                encoding='utf-8', storage='packed', incremental=False)
+        print(f"split_chapters 端到端 (packed): {time.perf_counter() - start:.3f}s, {len(chapters)} 章")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,176 @@
+# benchmarks/bench_json_codec.py
+"""JSON产物读写基准：原先的 json.dump(indent=2)/json.load 与 json_codec 各后端对比
+
+在临时输出目录中生成 N 章摘要，分别测量逐章文件写出/读回、blocks.json 写出/读回，
+以及 SummaryStore 批量写入/全量读取的耗时。
+
+用法（在 novel_analyzer 目录下）:
+    python benchmarks/bench_json_codec.py --chapters 5000
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json_codec
+from summary_store import SummaryStore
+
+EVENTS = ['主角离开宗门', '与宿敌初次交手', '得到神秘玉佩', '师父重伤闭关', '误入上古遗迹', '揭开身世之谜']
+ROLES = ['林逸@主角', '苏婉@师姐', '赵乾@宿敌', '玄机子@师父', '墨老@神秘人']
+SETTINGS = ['青云宗@宗门', '落霞山@地点', '玄天玉佩@法宝', '天元大陆@世界']
+
+
+def make_summaries(count, seed=42):
+    """生成与阶段一输出结构一致的合成章节摘要"""
+    rng = random.Random(seed)
+    summaries = []
+    for chapter in range(1, count + 1):
+        summaries.append({
+            'chapter': chapter,
+            'entities': {
+                'new_roles': rng.sample(ROLES, rng.randint(0, 2)),
+                'new_settings': rng.sample(SETTINGS, rng.randint(0, 2))
+            },
+            'summary': [f"{rng.choice(EVENTS)}，{rng.choice(EVENTS)}（第{chapter}章）" for _ in range(rng.randint(3, 6))],
+            'turning_score': rng.randint(1, 5)
+        })
+    return summaries
+
+
+def make_blocks(summaries, size=50):
+    blocks = []
+    for start in range(0, len(summaries), size):
+        chapters = [s['chapter'] for s in summaries[start:start + size]]
+        blocks.append({
+            'chapters': chapters,
+            'main_conflict': f"第{chapters[0]}-{chapters[-1]}章的主要冲突",
+            'turning_points': [c for c in chapters if summaries[c - 1]['turning_score'] >= 4]
+        })
+    return {'blocks': blocks}
+
+
+class StdlibIndented:
+    """原实现：每个产物 json.dump(indent=2, ensure_ascii=False) / json.load"""
+    name = '原实现 json indent=2'
+
+    @staticmethod
+    def write(path, obj):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(obj, f, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def read(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+
+class Codec:
+    def __init__(self, backend, pretty):
+        self.backend = backend
+        self.pretty = pretty
+        self.name = f"json_codec {backend}{' pretty' if pretty else ''}"
+
+    def activate(self):
+        json_codec.set_backend(self.backend)
+
+    def write(self, path, obj):
+        json_codec.write_json(path, obj, pretty=self.pretty)
+
+    @staticmethod
+    def read(path):
+        return json_codec.read_json(path)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def bench_files(impl, root, summaries, block_data):
+    summary_dir = os.path.join(root, 'stage1_summaries')
+    os.makedirs(summary_dir, exist_ok=True)
+    paths = [os.path.join(summary_dir, f"summary_{s['chapter']:03d}.json") for s in summaries]
+    block_path = os.path.join(root, 'blocks.json')
+
+    def dump_all():
+        for path, summary in zip(paths, summaries):
+            impl.write(path, summary)
+        impl.write(block_path, block_data)
+
+    def load_all():
+        return [impl.read(path) for path in paths], impl.read(block_path)
+
+    dump_time, _ = timed(dump_all)
+    load_time, (loaded, blocks) = timed(load_all)
+    if loaded != summaries or blocks != block_data:
+        raise AssertionError(f"{impl.name}: 读回内容与写入不一致")
+    size = sum(os.path.getsize(path) for path in paths) + os.path.getsize(block_path)
+    return dump_time, load_time, size
+
+
+def bench_store(root, summaries):
+    store = SummaryStore(os.path.join(root, 'summaries.sqlite'))
+    try:
+        put_time, _ = timed(store.put_many, [(s['chapter'], s) for s in summaries])
+        load_time, loaded = timed(store.load_all)
+    finally:
+        store.close()
+    if loaded != summaries:
+        raise AssertionError("SummaryStore 读回内容与写入不一致")
+    return put_time, load_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON产物读写基准")
+    parser.add_argument('--chapters', type=int, default=5000, help="合成章节数")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    summaries = make_summaries(args.chapters)
+    block_data = make_blocks(summaries)
+    default_backend = json_codec.backend()
+    print(f"章节数: {args.chapters}, 默认后端: {default_backend}")
+
+    impls = [StdlibIndented, Codec('json', False)]
+    if default_backend == 'orjson':
+        impls += [Codec('orjson', False), Codec('orjson', True)]
+        # 两种后端对摘要数据的输出应逐字节一致（差异见 json_codec 模块说明）
+        for pretty in (False, True):
+            json_codec.set_backend('orjson')
+            fast = json_codec.dumps_bytes(summaries, pretty)
+            json_codec.set_backend('json')
+            plain = json_codec.dumps_bytes(summaries, pretty)
+            if fast != plain:
+                print(f"错误: orjson 与标准库输出不一致 (pretty={pretty})")
+                return 1
+        json_codec.set_backend(default_backend)
+    else:
+        print("未安装 orjson，仅对比标准库")
+
+    print(f"{'实现':<28}{'写出':>10}{'读回':>10}{'体积':>12}")
+    for impl in impls:
+        if hasattr(impl, 'activate'):
+            impl.activate()
+        with tempfile.TemporaryDirectory() as tmp:
+            dump_time, load_time, size = bench_files(impl, tmp, summaries, block_data)
+        print(f"{impl.name:<28}{dump_time:>9.3f}s{load_time:>9.3f}s{size / 1048576:>10.2f}MB")
+
+    print("\nSummaryStore 批量写入 / 全量读取:")
+    for backend in dict.fromkeys(['json', default_backend]):
+        json_codec.set_backend(backend)
+        with tempfile.TemporaryDirectory() as tmp:
+            put_time, load_time = bench_store(tmp, summaries)
+        print(f"  {backend:<8} put_many {put_time:.3f}s, load_all {load_time:.3f}s")
+    json_codec.set_backend(default_backend)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+# benchmarks/bench_topic_shift.py
+"""阶段二主题转换特征基准：哈希字符 n-gram TF-IDF + 相邻窗口余弦距离
+
+合成若干主题词表，按随机长度的情节段落生成章节摘要，测量特征构建与边界检测耗时，
+并统计检出边界与真实段落边界的吻合程度。
+
+用法（在 novel_analyzer 目录下）:
+    python benchmarks/bench_topic_shift.py --chapters 10000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from topic_features import topic_shift
+from segmentation import shift_peaks
+
+SYLLABLES = ('天地玄黄宇宙洪荒', '日月盈昃', '辰宿列张')
+
+
+def make_summaries(count, topic_count=6, seed=42):
+    """每个情节段落 20-60 章，章节摘要只使用所属主题的词汇；返回 (摘要列表, 段落起点集合)"""
+    rng = random.Random(seed)
+    words = [a + b + c for a in SYLLABLES[0] for b in SYLLABLES[1] for c in SYLLABLES[2]]
+    size = len(words) // topic_count
+    topics = [words[i * size:(i + 1) * size] for i in range(topic_count)]
+    summaries = []
+    boundaries = set()
+    topic = None
+    while len(summaries) < count:
+        topic = rng.choice([t for t in range(topic_count) if t != topic])
+        boundaries.add(len(summaries))
+        vocabulary = topics[topic]
+        for _ in range(rng.randint(20, 60)):
+            chapter = len(summaries) + 1
+            summaries.append({
+                'chapter': chapter,
+                'summary': [''.join(rng.choices(vocabulary, k=6)) + '，主角前往' + rng.choice(vocabulary)
+                            for _ in range(5)],
+                'entities': {'new_roles': [rng.choice(vocabulary) + '@人物'], 'new_settings': []},
+                'turning_score': rng.randint(1, 5)
+            })
+    return summaries[:count], {b for b in boundaries if 0 < b < count}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="阶段二主题转换特征基准")
+    parser.add_argument('--chapters', type=int, default=10000, help="合成章节数")
+    parser.add_argument('--window', type=int, default=3, help="比较窗口章节数")
+    parser.add_argument('--cutoff', type=float, default=0.5, help="峰值阈值（均值 + cutoff·标准差）")
+    args = parser.parse_args()
+
+    summaries, truth = make_summaries(args.chapters)
+    start = time.perf_counter()
+    shift = topic_shift(summaries, window=args.window)
+    feature_time = time.perf_counter() - start
+    start = time.perf_counter()
+    peaks = shift_peaks(shift, cutoff=args.cutoff, radius=2)
+    peak_time = time.perf_counter() - start
+
+    near = {int(p) + d for p in peaks for d in (-1, 0, 1)}
+    hits = sum(1 for p in peaks if {p - 1, p, p + 1} & truth)
+    found = len(truth & near)
+    print(f"章节数: {len(summaries)}, 真实边界 {len(truth)} 个")
+    print(f"TF-IDF 特征 + 窗口距离: {feature_time:.3f}s")
+    print(f"峰值检测:              {peak_time:.3f}s, 检出 {len(peaks)} 个")
+    print(f"准确率 {hits / max(len(peaks), 1):.2%}, 召回率 {found / max(len(truth), 1):.2%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 产物依赖：章节分割 → 阶段1(每章) → 阶段2 → 阶段3(每块) → 阶段4，阶段2 → 可视化
+# 每个产物记录其输入内容、提示词和配置的哈希；上游产物内容变化会改变下游的输入哈希，
+# 因此只有指纹变化的产物需要重新计算，其余直接复用。
+
+
+def digest(value):
+    """对字符串、字节或可JSON序列化的对象计算稳定哈希"""
+    if isinstance(value, str):
+        data = value.encode('utf-8')
+    elif isinstance(value, bytes):
+        data = value
+    else:
+        data = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def digest_file(path, block_size=1 << 20):
+    file_hash = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+class BuildState:
+    """记录每个产物的输入指纹（SQLite，WAL），判断产物是否需要重新生成"""
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS artifacts ("
+            "artifact TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, inputs TEXT NOT NULL, "
+            "updated_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    @classmethod
+    def for_output_dir(cls, output_dir):
+        db_path = os.path.abspath(os.path.join(output_dir, 'build_state.sqlite'))
+        with cls._instances_lock:
+            state = cls._instances.get(db_path)
+            if state is None:
+                state = cls(db_path)
+                cls._instances[db_path] = state
+            return state
+
+    def check(self, artifact, inputs):
+        """返回变化的输入名列表：[] 表示指纹一致，None 表示从未记录过"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT fingerprint, inputs FROM artifacts WHERE artifact = ?", (artifact,)
+            ).fetchone()
+        if row is None:
+            return None
+        if row[0] == digest(inputs):
+            return []
+        recorded = json.loads(row[1])
+        return sorted(name for name in set(inputs) | set(recorded) if inputs.get(name) != recorded.get(name))
+
+    def recorded(self, artifact):
+        """返回产物上次记录的输入，没有记录时返回 None"""
+        with self.lock:
+            row = self.conn.execute("SELECT inputs FROM artifacts WHERE artifact = ?", (artifact,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def record(self, artifact, inputs):
+        with self.lock:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO artifacts (artifact, fingerprint, inputs, updated_at) VALUES (?, ?, ?, ?)",
+                    (artifact, digest(inputs), json.dumps(inputs, sort_keys=True), time.time())
+                )
+
+    def forget(self, artifacts):
+        """删除指定产物的记录"""
+        with self.lock:
+            with self.conn:
+                self.conn.executemany(
+                    "DELETE FROM artifacts WHERE artifact = ?", [(artifact,) for artifact in artifacts]
+                )
+
+    def is_current(self, artifact, inputs, output_exists, logger=logger):
+        """产物存在且指纹一致时返回 True；产物存在但没有记录（旧版本生成）时登记当前指纹并视为最新"""
+        if not output_exists:
+            return False
+        changed = self.check(artifact, inputs)
+        if changed is None:
+            self.record(artifact, inputs)
+            return True
+        if changed:
+            logger.info(f"{artifact} 的输入已变化 ({', '.join(changed)})，重新生成")
+            return False
+        return True
@@ -0,0 +1,68 @@
+import re
+
+# 行首：\n 之后（re.M 的 ^）或单独的 \r 之后，允许前导空白；只用于逐行校验的退化路径
+LINE_START = r'(?:^|(?<=\r))[^\S\r\n]*'
+# 这些写法在整段文本上匹配时结果可能与逐行 strip 后匹配不同，只能逐行校验
+LINE_SENSITIVE_TOKENS = ('$', '\\A', '\\Z', '\\b', '\\B', '(?=', '(?!', '(?<')
+BLANK_LINES = re.compile(r'\n\s*\n')
+LINE_BREAK = re.compile(r'[\r\n]')
+
+
+class ChapterScanner:
+    """在整段文本上用一个正则查找章节标题，按切片截取章节正文，不逐行分配字符串
+
+    判定结果与逐行 ``pattern.match(line.strip())`` 一致：整段搜索只用于快速定位候选行，
+    每个候选行仍用原始正则校验。
+    """
+
+    def __init__(self, chapter_regex):
+        self.pattern = re.compile(chapter_regex)
+        body = chapter_regex[1:] if chapter_regex.startswith('^') else chapter_regex
+        self.finder = None
+        self.at_line_start = False
+        if not any(token in body for token in LINE_SENSITIVE_TOKENS) and '^' not in body.replace('[^', ''):
+            try:
+                # 不加行首锚点：正则以字面量开头时 re 可以直接跳到候选位置
+                self.finder = re.compile(body)
+            except re.error:
+                pass
+        if self.finder is None:
+            # 退化为逐行候选，仍然避免为正文行分配字符串
+            self.finder = re.compile(LINE_START, re.M)
+            self.at_line_start = True
+
+    def iter_titles(self, text, pos=0):
+        """产出 (标题行起点, 正文起点, 标题)；正文起点为标题行换行符之后"""
+        search = self.finder.search
+        match_title = self.pattern.match
+        length = len(text)
+        while pos < length:
+            match = search(text, pos)
+            if not match:
+                return
+            hit = match.start()
+            if self.at_line_start:
+                line_start = hit
+            else:
+                newline = text.rfind('\n', 0, hit)
+                line_start = max(newline, text.rfind('\r', newline + 1, hit)) + 1
+                if text[line_start:hit].strip():
+                    # 命中位置前还有正文，不是标题行；从下一个字符继续，避免越过后面的行首
+                    pos = hit + 1
+                    continue
+            line_break = LINE_BREAK.search(text, hit)
+            line_end = line_break.start() if line_break else length
+            next_line = line_end + 2 if text.startswith('\r\n', line_end) else line_end + 1
+            title = text[line_start:line_end].strip()
+            if match_title(title):
+                yield line_start, next_line, title
+                pos = next_line
+            else:
+                pos = next_line if self.at_line_start else hit + 1
+
+    @staticmethod
+    def clean_content(segment):
+        """统一换行、去掉空白行并首尾去空白，等价于逐行过滤空行后 '\\n'.join(...).strip()"""
+        if '\r' in segment:
+            segment = segment.replace('\r\n', '\n').replace('\r', '\n')
+        return BLANK_LINES.sub('\n', segment).strip()
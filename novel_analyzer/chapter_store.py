@@ -0,0 +1,223 @@
+import os
+import re
+import json_codec
+import mmap
+import struct
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+PACKED_DATA = 'chapters.dat'
+PACKED_INDEX = 'chapters.idx'
+MANIFEST = 'manifest.json'
+MANIFEST_VERSION = 1
+INDEX_MAGIC = b'NCHI'
+INDEX_HEADER = struct.Struct('<4sHI')
+INDEX_RECORD = struct.Struct('<IQI')
+CHAPTER_FILE_PATTERN = re.compile(r'ch_(\d+)\.txt$')
+
+
+def format_chapter(title, content):
+    return f"{title}\n\n{content}"
+
+
+def content_hash(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def load_manifest(chapter_dir):
+    """读取分割清单，不存在或版本不符时返回 None"""
+    path = os.path.join(chapter_dir, MANIFEST)
+    try:
+        manifest = json_codec.read_json(path)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def save_manifest(chapter_dir, manifest):
+    path = os.path.join(chapter_dir, MANIFEST)
+    manifest['version'] = MANIFEST_VERSION
+    # 始终不缩进：清单只供程序读取，上万章时缩进输出明显拖慢分割
+    json_codec.write_json(path + '.tmp', manifest, pretty=False)
+    os.replace(path + '.tmp', path)
+
+
+class ChapterFileWriter:
+    """每章一个 ch_NNN.txt 文件"""
+
+    def __init__(self, chapter_dir, keep=()):
+        self.chapter_dir = chapter_dir
+        os.makedirs(chapter_dir, exist_ok=True)
+        # 增量分割时保留未变化的章节文件
+        self.outputs = [self._path(num) for num in keep]
+
+    def _path(self, num):
+        return os.path.join(self.chapter_dir, f'ch_{num:03d}.txt')
+
+    def add(self, num, title, content):
+        filename = self._path(num)
+        with open(filename, 'w', encoding='utf-8', errors='replace') as f:
+            f.write(format_chapter(title, content))
+        self.outputs.append(filename)
+
+    def close(self):
+        """删除本次未写出的旧章节文件（源文件章节减少时），返回全部章节路径"""
+        written = set(self.outputs)
+        for path in ChapterDirectory(self.chapter_dir).paths.values():
+            if path not in written:
+                os.remove(path)
+        return self.outputs
+
+    def abort(self):
+        self.outputs = []
+
+
+class PackedChapterWriter:
+    """所有章节写入单个UTF-8数据文件，另存 (章节号, 偏移, 长度) 索引"""
+
+    def __init__(self, chapter_dir, keep=()):
+        self.chapter_dir = chapter_dir
+        os.makedirs(chapter_dir, exist_ok=True)
+        self.data_path = os.path.join(chapter_dir, PACKED_DATA)
+        self.index_path = os.path.join(chapter_dir, PACKED_INDEX)
+        self.data_file = open(self.data_path + '.tmp', 'wb')
+        self.records = []
+        self.offset = 0
+        if keep:
+            # 增量分割：从旧数据文件拷贝未变化章节的原始字节，无需重新编码
+            store = PackedChapterStore(chapter_dir)
+            try:
+                for num in keep:
+                    self._append(num, store.read_bytes(num))
+            finally:
+                store.close()
+
+    def _append(self, num, data):
+        self.data_file.write(data)
+        self.records.append((num, self.offset, len(data)))
+        self.offset += len(data)
+
+    def add(self, num, title, content):
+        self._append(num, format_chapter(title, content).encode('utf-8', 'replace'))
+
+    def close(self):
+        """写索引并原子替换旧文件，返回章节号列表"""
+        self.data_file.close()
+        self.records.sort()
+        with open(self.index_path + '.tmp', 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, 1, len(self.records)))
+            for record in self.records:
+                f.write(INDEX_RECORD.pack(*record))
+        os.replace(self.data_path + '.tmp', self.data_path)
+        os.replace(self.index_path + '.tmp', self.index_path)
+        return [num for num, _, _ in self.records]
+
+    def abort(self):
+        self.data_file.close()
+        os.remove(self.data_path + '.tmp')
+
+
+class PackedChapterStore:
+    """通过mmap读取打包章节，按章节号或区间取内容，无需打开大量小文件"""
+
+    def __init__(self, chapter_dir):
+        self.chapter_dir = chapter_dir
+        with open(os.path.join(chapter_dir, PACKED_INDEX), 'rb') as f:
+            magic, version, count = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+            if magic != INDEX_MAGIC:
+                raise ValueError(f"无效的章节索引文件: {chapter_dir}")
+            raw = f.read(INDEX_RECORD.size * count)
+        self.index = {num: (offset, length) for num, offset, length in INDEX_RECORD.iter_unpack(raw)}
+        self.numbers = sorted(self.index)
+        self.data_file = open(os.path.join(chapter_dir, PACKED_DATA), 'rb')
+        if os.fstat(self.data_file.fileno()).st_size:
+            self.data = mmap.mmap(self.data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.data = b''
+
+    @staticmethod
+    def exists(chapter_dir):
+        return os.path.exists(os.path.join(chapter_dir, PACKED_INDEX)) and \
+            os.path.exists(os.path.join(chapter_dir, PACKED_DATA))
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def chapter_numbers(self):
+        return list(self.numbers)
+
+    def read_bytes(self, num):
+        offset, length = self.index[num]
+        return self.data[offset:offset + length]
+
+    def read_chapter(self, num):
+        return self.read_bytes(num).decode('utf-8')
+
+    def read_range(self, start, end):
+        """读取 [start, end] 区间内存在的章节，产出 (章节号, 内容)"""
+        for num in self.numbers:
+            if num > end:
+                break
+            if num >= start:
+                yield num, self.read_chapter(num)
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.data_file.close()
+
+
+class ChapterDirectory:
+    """ch_NNN.txt 目录的只读视图，与 PackedChapterStore 接口一致"""
+
+    def __init__(self, chapter_dir):
+        self.chapter_dir = chapter_dir
+        self.paths = {}
+        with os.scandir(chapter_dir) as entries:
+            for entry in entries:
+                match = CHAPTER_FILE_PATTERN.match(entry.name)
+                if match:
+                    self.paths[int(match.group(1))] = entry.path
+        self.numbers = sorted(self.paths)
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def chapter_numbers(self):
+        return list(self.numbers)
+
+    def read_chapter(self, num):
+        with open(self.paths[num], 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def read_range(self, start, end):
+        for num in self.numbers:
+            if num > end:
+                break
+            if num >= start:
+                yield num, self.read_chapter(num)
+
+    def close(self):
+        pass
+
+
+def create_chapter_writer(chapter_dir, storage='files', keep=()):
+    if storage == 'packed':
+        return PackedChapterWriter(chapter_dir, keep)
+    return ChapterFileWriter(chapter_dir, keep)
+
+
+def open_chapter_source(chapter_dir, storage='files'):
+    """按配置的存储格式打开章节来源，首选格式不存在时退回另一种"""
+    if not os.path.isdir(chapter_dir):
+        return None
+    if storage == 'packed' and PackedChapterStore.exists(chapter_dir):
+        return PackedChapterStore(chapter_dir)
+    directory = ChapterDirectory(chapter_dir)
+    if not directory.numbers and PackedChapterStore.exists(chapter_dir):
+        return PackedChapterStore(chapter_dir)
+    return directory
@@ -1,8 +1,9 @@
 # config_manager.py
-import json
 import os
 import configparser
 import logging
+import json_codec
+from terminology_store import TerminologyStore
 
 logger = logging.getLogger(__name__)
 
@@ -17,20 +18,40 @@ class ConfigManager:
                 'output_dir': 'output',
                 'api_engine': 'DeepSeek',
                 'api_key': '',
-                'api_plan': 'free'
+                'api_plan': 'free',
+                'api_tpm': '0',
+                'api_burst': '0',
+                'api_rpm_ceiling': '0',
+                'api_backends': '',
+                'api_backend_cooldown': '60',
+                'concurrency': '4',
+                'connect_timeout': '10',
+                'read_timeout': '120',
+                'response_cache': 'true',
+                'cache_max_mb': '512',
+                'cache_max_age_days': '30',
+                'json_pretty': 'false'
             },
             'chapter_split': {
                 'regex': r'第[零一二三四五六七八九十百千0-9]+章',
-                'encoding': 'auto'
+                'encoding': 'auto',
+                'storage': 'files',
+                'incremental': 'true'
             },
             'stage1': {
                 'chapter_range': 'all',
                 'term_binding': 'true',
+                'core_terms': '',
+                'core_term_count': '10',
                 'prompt': """# 角色：小说分析师..."""
             },
             'stage2': {
                 'block_sensitivity': 'medium',
                 'cross_volume': 'false',
+                'window_size': '200',
+                'window_overlap': '20',
+                'topic_shift': 'true',
+                'topic_window': '3',
                 'prompt': """# 角色：分块分析师..."""
             },
             'stage3': {
@@ -50,6 +71,7 @@ class ConfigManager:
             self.config.read(config_path, encoding='utf-8')
         else:
             self._create_default_config()
+        json_codec.set_pretty(self.get('global', 'json_pretty', 'false') == 'true')
 
     def _create_default_config(self):
         for section, options in self.defaults.items():
@@ -70,25 +92,15 @@ class ConfigManager:
         if not self.config.has_section(section):
             self.config.add_section(section)
         self.config.set(section, option, str(value))
+        if (section, option) == ('global', 'json_pretty'):
+            json_codec.set_pretty(str(value) == 'true')
 
     def load_terminology(self):
         output_dir = self.get('global', 'output_dir', 'output')
-        term_path = os.path.join(output_dir, 'terminology.json')
-        if os.path.exists(term_path):
-            try:
-                with open(term_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
+        return TerminologyStore.for_output_dir(output_dir).snapshot()
 
     def update_terminology(self, new_terms):
         output_dir = self.get('global', 'output_dir', 'output')
-        term_path = os.path.join(output_dir, 'terminology.json')
-        current_terms = self.load_terminology()
-        current_terms.update(new_terms)
-
-        os.makedirs(os.path.dirname(term_path), exist_ok=True)
-        with open(term_path, 'w', encoding='utf-8') as f:
-            json.dump(current_terms, f, ensure_ascii=False, indent=2)
-        return current_terms
\ No newline at end of file
+        store = TerminologyStore.for_output_dir(output_dir)
+        store.add(new_terms, overwrite=True)
+        return store.snapshot()
\ No newline at end of file
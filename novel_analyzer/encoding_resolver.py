@@ -0,0 +1,149 @@
+import os
+import json_codec
+import mmap
+import codecs
+import hashlib
+import logging
+import threading
+import chardet
+
+logger = logging.getLogger(__name__)
+
+
+class EncodingResolver:
+    """一次映射原始字节，在采样窗口上探测候选编码，结果按文件指纹缓存"""
+    CANDIDATES = ['utf-8', 'gb18030', 'gbk', 'big5', 'latin1']
+    BOMS = [
+        (b'\xef\xbb\xbf', 'utf-8-sig'),
+        (b'\xff\xfe\x00\x00', 'utf-32'),
+        (b'\x00\x00\xfe\xff', 'utf-32-be'),
+        (b'\xff\xfe', 'utf-16'),
+        (b'\xfe\xff', 'utf-16-be')
+    ]
+    _cache_lock = threading.Lock()
+
+    def __init__(self, cache_path=None, window_size=64 * 1024, window_count=16):
+        self.cache_path = cache_path
+        self.window_size = window_size
+        self.window_count = window_count
+
+    def _windows(self, data):
+        """均匀分布的采样窗口，包含文件首尾"""
+        size = len(data)
+        if size <= self.window_size * self.window_count:
+            return [(0, data[:])]
+        step = (size - self.window_size) // (self.window_count - 1)
+        return [(i * step, data[i * step:i * step + self.window_size]) for i in range(self.window_count)]
+
+    def fingerprint(self, data):
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(str(len(data)).encode())
+        for _, window in self._windows(data):
+            digest.update(window)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _probe_window(window, encoding, at_start):
+        """严格解码一个窗口；窗口中间起始时允许跳过最多3个被截断的字节"""
+        shifts = [0] if at_start else [0, 1, 2, 3]
+        for shift in shifts:
+            decoder = codecs.getincrementaldecoder(encoding)(errors='strict')
+            try:
+                decoder.decode(window[shift:], final=False)
+                return True
+            except UnicodeDecodeError:
+                continue
+        return False
+
+    def probe(self, data, encoding):
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            logger.warning(f"未知编码: {encoding}")
+            return False
+        for offset, window in self._windows(data):
+            if not self._probe_window(window, encoding, offset == 0):
+                logger.info(f"编码 {encoding} 采样探测失败 (偏移 {offset})")
+                return False
+        return True
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            return json_codec.read_json(self.cache_path)
+        except (OSError, ValueError):
+            return {}
+
+    def remember(self, fingerprint, encoding):
+        """记录完整解码成功的编码"""
+        if not self.cache_path:
+            return
+        with self._cache_lock:
+            cache = self._load_cache()
+            cache[fingerprint] = encoding
+            os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+            json_codec.write_json(self.cache_path, cache)
+
+    def forget(self, fingerprint):
+        if not self.cache_path:
+            return
+        with self._cache_lock:
+            cache = self._load_cache()
+            if cache.pop(fingerprint, None) is not None:
+                json_codec.write_json(self.cache_path, cache)
+
+    def resolve(self, novel_path, preferred='auto', use_cache=True):
+        """返回 (文件指纹, 候选列表, 是否来自缓存)，候选为按优先级排列的 (编码, 错误处理方式)
+
+        自动检测且缓存命中时直接返回缓存的编码，不再探测
+        """
+        with open(novel_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None, [('utf-8', 'strict')], False
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                fingerprint = self.fingerprint(data)
+                if use_cache and preferred == 'auto':
+                    cached = self._load_cache().get(fingerprint)
+                    if cached:
+                        logger.info(f"使用缓存的文件编码: {cached}")
+                        return fingerprint, [(cached, 'strict')], True
+                return fingerprint, self._probe_candidates(data, preferred), False
+
+    def _probe_candidates(self, data, preferred):
+        candidates = []
+        head = data[:4]
+        for bom, encoding in self.BOMS:
+            if head.startswith(bom):
+                logger.info(f"检测到BOM: {encoding}")
+                candidates.append((encoding, 'strict'))
+                break
+
+        if preferred != 'auto':
+            if self.probe(data, preferred):
+                candidates.append((preferred, 'strict'))
+            else:
+                logger.warning(f"手动编码 {preferred} 采样探测失败，改为自动检测")
+
+        for encoding in self.CANDIDATES:
+            if encoding == 'latin1':
+                break
+            if self.probe(data, encoding):
+                candidates.append((encoding, 'strict'))
+
+        detected = chardet.detect(data[:1 << 20])
+        if detected['encoding'] and detected['confidence'] > 0.7:
+            logger.info(f"chardet 建议编码: {detected['encoding']} (置信度 {detected['confidence']:.2f})")
+            candidates.append((detected['encoding'], 'strict'))
+
+        candidates.append(('latin1', 'strict'))
+
+        unique = []
+        for candidate in candidates:
+            if candidate not in unique:
+                unique.append(candidate)
+        return unique
+
+    def detect(self, novel_path, preferred='auto'):
+        """返回首选编码"""
+        return self.resolve(novel_path, preferred)[1][0][0]
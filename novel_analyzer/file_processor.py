@@ -1,14 +1,23 @@
 # file_processor.py
 import os
 import re
-import json
+import codecs
+import hashlib
+import json_codec
 import pandas as pd
 import chardet
 import logging
 from collections import defaultdict
+from encoding_resolver import EncodingResolver
+from chapter_scanner import ChapterScanner
+from summary_store import SummaryStore
+from chapter_store import (ChapterDirectory, PackedChapterStore, content_hash, create_chapter_writer,
+                           format_chapter, load_manifest, open_chapter_source, save_manifest)
 
 logger = logging.getLogger(__name__)
 
+SPLIT_BLOCK_SIZE = 1 << 22
+
 
 class FileProcessor:
     progress_callback = None
@@ -61,193 +70,315 @@ class FileProcessor:
             os.makedirs(os.path.join(output_dir, d), exist_ok=True)
         term_path = os.path.join(output_dir, 'terminology.json')
         if not os.path.exists(term_path):
-            with open(term_path, 'w', encoding='utf-8') as f:
-                json.dump({}, f)
+            json_codec.write_json(term_path, {})
 
     @staticmethod
-    def split_chapters(novel_path, output_dir, chapter_regex=r'第[零一二三四五六七八九十百千0-9]+章', encoding='auto'):
-        encodings_to_try = ['utf-8', 'gb18030', 'gbk', 'big5', 'latin1']
-        content = None
+    def iter_blocks(novel_path, encoding, errors='strict', start=0, block_size=SPLIT_BLOCK_SIZE):
+        """增量解码按块读取，每块以换行结尾（最后一块除外），任何一行都完整落在某一块内
 
-        try:
-            if encoding != 'auto':
-                try:
-                    with open(novel_path, 'r', encoding=encoding) as f:
-                        content = f.read()
-                    logger.info(f"使用手动指定编码: {encoding}")
-                except Exception as e:
-                    logger.warning(f"手动编码 {encoding} 失败: {str(e)}")
-                    encoding = 'auto'
-
-            if encoding == 'auto':
-                logger.info("开始自动检测文件编码...")
-                for encoding in encodings_to_try:
-                    try:
-                        with open(novel_path, 'r', encoding=encoding) as f:
-                            content = f.read()
-                        logger.info(f"成功使用编码: {encoding}")
-                        break
-                    except UnicodeDecodeError as e:
-                        error_position = e.args[2]
-                        context_start = max(0, error_position - 20)
-                        context_end = min(len(content) if content else 0, error_position + 20)
-                        context = content[context_start:context_end] if content else ""
-                        logger.warning(f"编码 {encoding} 失败: {str(e)}")
-                        logger.warning(f"错误位置: {error_position}, 上下文: {context}")
-                        continue
-                    except Exception as e:
-                        logger.error(f"文件读取异常: {str(e)}")
-                        continue
-
-            if content is None:
-                logger.warning("标准编码尝试失败，使用高级编码检测")
-                try:
-                    encoding = FileProcessor.advanced_detect_encoding(novel_path)
-                    logger.info(f"高级检测建议编码: {encoding}")
-                    with open(novel_path, 'r', encoding=encoding) as f:
-                        content = f.read()
-                except Exception as e:
-                    logger.error(f"高级编码检测失败: {str(e)}")
+        start 必须是某一行的起始字节偏移（增量分割时从该处继续）
+        """
+        decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+        pending = ''
+        with open(novel_path, 'rb') as f:
+            f.seek(start)
+            while True:
+                raw = f.read(block_size)
+                text = pending + decoder.decode(raw, final=not raw)
+                if not raw:
+                    if text:
+                        yield text
+                    return
+                cut = text.rfind('\n') + 1
+                pending = text[cut:]
+                if cut:
+                    yield text[:cut]
 
-            if content is None:
-                logger.error("所有编码尝试失败，使用二进制模式读取并忽略错误")
+    @staticmethod
+    def split_chapters(novel_path, output_dir, chapter_regex=r'第[零一二三四五六七八九十百千0-9]+章', encoding='auto',
+                       storage='files', incremental=True):
+        """按采样探测出的候选编码依次尝试流式分割，整个文件只完整解码一次
+
+        incremental 为真且上次分割的清单仍然适用时，只重新分割源文件中变化或追加的部分
+        """
+        chapter_dir = os.path.join(output_dir, 'chapters')
+        manifest = load_manifest(chapter_dir)
+        preferred = encoding
+        if incremental and manifest and encoding == 'auto':
+            # 沿用上次分割的编码，保证未变化的章节可以直接复用
+            preferred = manifest['encoding']
+        resolver = EncodingResolver(os.path.join(output_dir, 'encoding_cache.json'))
+        use_cache = True
+        while True:
+            try:
+                fingerprint, candidates, from_cache = resolver.resolve(novel_path, preferred, use_cache)
+            except PermissionError as e:
+                logger.error(f"文件权限被拒绝: {novel_path} - 请检查文件是否被其他程序占用")
+                logger.error(f"详细错误: {str(e)}")
+                return []
+            except Exception as e:
+                logger.error(f"文件处理异常: {str(e)}")
+                return []
+
+            for candidate, errors in candidates:
                 try:
-                    with open(novel_path, 'rb') as f:
-                        binary_data = f.read()
-                    detected = chardet.detect(binary_data)
-                    if detected['confidence'] > 0.7:
-                        encoding = detected['encoding']
-                        logger.info(f"二进制检测编码: {encoding}")
-                        content = binary_data.decode(encoding, errors='ignore')
-                    else:
-                        content = binary_data.decode('utf-8', errors='ignore')
-                        logger.warning("使用utf-8并忽略解码错误")
+                    resume = None
+                    if incremental and manifest:
+                        resume = FileProcessor._plan_resume(
+                            novel_path, chapter_dir, manifest, chapter_regex, candidate, storage
+                        )
+                    chapter_files, entries = FileProcessor._split_stream(
+                        novel_path, output_dir, chapter_regex, candidate, errors, storage, resume
+                    )
+                except UnicodeDecodeError as e:
+                    logger.warning(f"编码 {candidate} 完整解码失败: {str(e)}")
+                    continue
                 except Exception as e:
-                    logger.critical(f"最终文件读取失败: {str(e)}")
+                    logger.error(f"章节分割异常: {str(e)}")
                     return []
-        except PermissionError as e:
-            logger.error(f"文件权限被拒绝: {novel_path} - 请检查文件是否被其他程序占用")
-            logger.error(f"详细错误: {str(e)}")
-            return []
-        except Exception as e:
-            logger.error(f"文件处理异常: {str(e)}")
-            return []
+                logger.info(f"成功使用编码: {candidate}")
+                if fingerprint and not from_cache:
+                    resolver.remember(fingerprint, candidate)
+                FileProcessor._write_manifest(novel_path, chapter_dir, manifest, entries,
+                                              chapter_regex, candidate, storage)
+                return chapter_files
+
+            if not from_cache:
+                logger.critical("所有编码尝试失败")
+                return []
+            # 缓存的编码已失效，清除后重新探测
+            resolver.forget(fingerprint)
+            use_cache = False
+
+    @staticmethod
+    def _hash_ranges(novel_path, ranges):
+        """顺序读取源文件，逐个计算 [start, end) 字节区间的哈希，出现不匹配时可提前停止"""
+        with open(novel_path, 'rb') as f:
+            for start, end in ranges:
+                f.seek(start)
+                digest = hashlib.blake2b(digest_size=16)
+                remaining = end - start
+                while remaining > 0:
+                    block = f.read(min(remaining, 1 << 20))
+                    if not block:
+                        break
+                    digest.update(block)
+                    remaining -= len(block)
+                yield digest.hexdigest()
+
+    @staticmethod
+    def _plan_resume(novel_path, chapter_dir, manifest, chapter_regex, encoding, storage):
+        """比对清单中各章节的源字节哈希，找出未变化的章节前缀，返回续分割计划；无法复用时返回 None
+
+        最后一章总是重新分割，因为追加的内容通常接在它后面
+        """
+        if not manifest.get('resumable') or manifest['regex'] != chapter_regex or \
+                manifest['encoding'] != encoding or manifest['storage'] != storage:
+            return None
+        try:
+            # 字节偏移按 b'\n' 计算，只对换行符与ASCII一致的编码有效
+            if '\n'.encode(encoding) != b'\n':
+                return None
+        except LookupError:
+            return None
+
+        chapters = manifest['chapters']
+        if len(chapters) < 2:
+            return None
 
-        if content.startswith('\ufeff'):
-            content = content[1:]
-            logger.info("移除UTF-8 BOM头")
-        content = content.encode('utf-8', 'replace').decode('utf-8')
+        numbers = [chapter['num'] for chapter in chapters[:-1]]
+        if storage == 'packed':
+            if not PackedChapterStore.exists(chapter_dir):
+                return None
+            store = PackedChapterStore(chapter_dir)
+            available = set(store.numbers)
+            store.close()
+        else:
+            available = set(ChapterDirectory(chapter_dir).numbers)
+        if not set(numbers) <= available:
+            return None
+
+        ranges = [(chapter['offset'], following['offset']) for chapter, following in zip(chapters, chapters[1:])]
+        kept = 0
+        for chapter, digest in zip(chapters, FileProcessor._hash_ranges(novel_path, ranges)):
+            if digest != chapter['source_hash']:
+                break
+            kept += 1
 
-        lines = content.split('\n')
+        # 续分割起点必须仍是章节标题行，否则上一章其实也变了
         pattern = re.compile(chapter_regex)
-        chapters = []
-        current_chapter = []
+        with open(novel_path, 'rb') as f:
+            f.seek(chapters[kept]['offset'])
+            line = f.readline().decode(encoding, errors='replace').strip()
+        if not pattern.match(line):
+            kept -= 1
+        if kept <= 0:
+            return None
+
+        title_counts = defaultdict(int)
+        for chapter in chapters[:kept]:
+            title_counts[chapter['heading']] += 1
+        return {
+            'offset': chapters[kept]['offset'],
+            'chapter_num': kept + 1,
+            'keep': numbers[:kept],
+            'entries': chapters[:kept],
+            'title_counts': title_counts
+        }
+
+    @staticmethod
+    def _write_manifest(novel_path, chapter_dir, previous, entries, chapter_regex, encoding, storage):
+        """记录本次分割清单，并与上次清单比对得出新增或内容变化的章节"""
+        numbers = [entry['num'] for entry in entries]
+        if previous:
+            old_hashes = {chapter['num']: chapter['hash'] for chapter in previous['chapters']}
+            changed = [entry['num'] for entry in entries if old_hashes.get(entry['num']) != entry['hash']]
+            removed = sorted(set(old_hashes) - set(numbers))
+        else:
+            changed = numbers
+            removed = []
+        offsets = [entry['offset'] for entry in entries]
+        save_manifest(chapter_dir, {
+            'source_size': os.path.getsize(novel_path),
+            'encoding': encoding,
+            'regex': chapter_regex,
+            'storage': storage,
+            # 行偏移必须严格递增（例如仅用 \r 换行的文件无法按字节定位）
+            'resumable': all(a < b for a, b in zip(offsets, offsets[1:])),
+            'previous': previous is not None,
+            'changed': changed,
+            'removed': removed,
+            'chapters': entries
+        })
+        if previous:
+            logger.info(f"与上次分割相比: {len(changed)} 章新增或变化, {len(removed)} 章已删除")
+
+    @staticmethod
+    def _split_stream(novel_path, output_dir, chapter_regex, encoding, errors, storage='files', resume=None):
+        """流式分割：按块解码，在整块文本上定位标题并按切片截取章节，峰值内存只与块和最大章节相关
+
+        返回 (章节列表, 清单条目)；resume 为 _plan_resume 的结果时从其字节偏移继续
+        """
+        scanner = ChapterScanner(chapter_regex)
+        # 增量编码器与源文件逐字节对应（含BOM），用于把字符位置换算为字节偏移
+        encoder = codecs.getincrementalencoder(encoding)(errors='replace')
+        total_size = os.path.getsize(novel_path) or 1
+
+        pieces = []  # 当前章节跨块的正文切片
         chapter_title = ""
-        chapter_num = 1
-        chapter_title_counts = defaultdict(int)
-        skip_preface = True
-
-        for i, line in enumerate(lines):
-            if skip_preface:
-                if pattern.match(line.strip()):
-                    skip_preface = False
-                    chapter_title = line.strip()
-                    chapter_title_counts[chapter_title] += 1
-                    logger.info(f"检测到章节标题: {chapter_title} (第{chapter_num}章)")
-                continue
+        title_offset = 0
+        if resume:
+            start = resume['offset']
+            chapter_num = resume['chapter_num']
+            chapter_title_counts = defaultdict(int, resume['title_counts'])
+            entries = list(resume['entries'])
+            keep = resume['keep']
+            logger.info(f"增量分割: 保留前 {len(keep)} 章，从第 {chapter_num} 章 (字节偏移 {start}) 开始重新分割")
+        else:
+            start = 0
+            chapter_num = 1
+            chapter_title_counts = defaultdict(int)
+            entries = []
+            keep = ()
+        kept_count = len(entries)
+        offset = start
+        writer = create_chapter_writer(os.path.join(output_dir, 'chapters'), storage, keep)
 
-            if pattern.match(line.strip()):
-                if chapter_title:
-                    count = chapter_title_counts[chapter_title]
-                    suffix = f"_{count}" if count > 1 else ""
-                    final_title = chapter_title + suffix
-                    chapter_content = '\n'.join(current_chapter).strip()
-                    if not chapter_content:
-                        chapter_content = final_title
-                        logger.warning(f"章节 {chapter_num} 内容为空: {final_title}")
-                    chapters.append((chapter_num, final_title, chapter_content))
-                    logger.info(f"保存章节 {chapter_num}: {final_title} (内容长度: {len(chapter_content)})")
-                    chapter_num += 1
-                chapter_title = line.strip()
-                chapter_title_counts[chapter_title] += 1
-                current_chapter = []
-                logger.info(f"检测到新章节标题: {chapter_title} (第{chapter_num}章)")
-            else:
-                if line.strip():
-                    current_chapter.append(line)
-
-        if chapter_title:
+        def close_chapter():
             count = chapter_title_counts[chapter_title]
             suffix = f"_{count}" if count > 1 else ""
             final_title = chapter_title + suffix
-            chapter_content = '\n'.join(current_chapter).strip()
+            chapter_content = ChapterScanner.clean_content(''.join(pieces))
             if not chapter_content:
                 chapter_content = final_title
                 logger.warning(f"章节 {chapter_num} 内容为空: {final_title}")
-            chapters.append((chapter_num, final_title, chapter_content))
+            writer.add(chapter_num, final_title, chapter_content)
+            entries.append({
+                'num': chapter_num,
+                'heading': chapter_title,
+                'title': final_title,
+                'offset': title_offset,
+                'hash': content_hash(format_chapter(final_title, chapter_content).encode('utf-8', 'replace'))
+            })
             logger.info(f"保存章节 {chapter_num}: {final_title} (内容长度: {len(chapter_content)})")
 
-        chapter_files = []
-        total_chapters = len(chapters)
-        chapter_dir = os.path.join(output_dir, 'chapters')
-        os.makedirs(chapter_dir, exist_ok=True)
-        generated_chapter_nums = set()
-
-        for idx, (num, title, content) in enumerate(chapters):
-            if num in generated_chapter_nums:
-                logger.warning(f"章节编号 {num} 重复，将跳过")
-                continue
-            generated_chapter_nums.add(num)
-            filename = os.path.join(chapter_dir, f'ch_{num:03d}.txt')
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(f"{title}\n\n{content}")
-            chapter_files.append(filename)
-            if FileProcessor.progress_callback:
-                FileProcessor.progress_callback(idx + 1, total_chapters)
-
-        if generated_chapter_nums:
-            min_num = min(generated_chapter_nums)
-            max_num = max(generated_chapter_nums)
-            missing_chapters = [num for num in range(min_num, max_num + 1) if num not in generated_chapter_nums]
-            if missing_chapters:
-                logger.warning(f"检测到缺失章节: {', '.join(map(str, missing_chapters))}")
-                logger.info("跳过缺失章节的文件编号")
-
-        logger.info(
-            f"成功分割 {len(chapter_files)} 个章节 (从第{min(generated_chapter_nums, default=0)}章到第{max(generated_chapter_nums, default=0)}章)")
-        return chapter_files
+        try:
+            for block in FileProcessor.iter_blocks(novel_path, encoding, errors, start):
+                if not offset and block.startswith('\ufeff'):
+                    offset += len(encoder.encode('\ufeff'))
+                    block = block[1:]
+                    logger.info("移除UTF-8 BOM头")
+                anchor = 0
+                body_start = 0
+                for line_start, next_body, title in scanner.iter_titles(block):
+                    # 只对两个标题之间的文本编码一次以换算字节偏移
+                    offset += len(encoder.encode(block[anchor:line_start]))
+                    anchor = line_start
+                    if chapter_title:
+                        pieces.append(block[body_start:line_start])
+                        close_chapter()
+                        chapter_num += 1
+                        if FileProcessor.progress_callback:
+                            FileProcessor.progress_callback(offset, total_size)
+                    chapter_title = title
+                    title_offset = offset
+                    chapter_title_counts[chapter_title] += 1
+                    pieces = []
+                    body_start = next_body
+                    logger.info(f"检测到章节标题: {chapter_title} (第{chapter_num}章)")
+                offset += len(encoder.encode(block[anchor:]))
+                if chapter_title:
+                    pieces.append(block[body_start:])
+
+            if chapter_title:
+                close_chapter()
+        except Exception:
+            writer.abort()
+            raise
+        chapter_files = writer.close()
+
+        # 新写出章节的源字节哈希，供下次增量分割比对
+        new_entries = entries[kept_count:]
+        ends = [entry['offset'] for entry in new_entries[1:]] + [os.path.getsize(novel_path)]
+        ranges = [(entry['offset'], end) for entry, end in zip(new_entries, ends)]
+        for entry, digest in zip(new_entries, FileProcessor._hash_ranges(novel_path, ranges)):
+            entry['source_hash'] = digest
+
+        if FileProcessor.progress_callback:
+            FileProcessor.progress_callback(total_size, total_size)
+        logger.info(f"成功分割 {len(chapter_files)} 个章节 (从第1章到第{len(chapter_files)}章)")
+        return chapter_files, entries
 
     @staticmethod
     def get_chapter_files(output_dir):
         chapter_dir = os.path.join(output_dir, 'chapters')
         if not os.path.exists(chapter_dir):
             return []
-        return sorted(
-            [os.path.join(chapter_dir, f) for f in os.listdir(chapter_dir) if f.endswith('.txt')],
-            key=lambda x: int(os.path.basename(x).split('_')[1].split('.')[0])
-        )
+        directory = ChapterDirectory(chapter_dir)
+        return [directory.paths[num] for num in directory.numbers]
+
+    @staticmethod
+    def open_chapter_source(output_dir, storage='files'):
+        """打开章节来源（ch_NNN.txt 目录或打包存储），均不存在时返回 None"""
+        return open_chapter_source(os.path.join(output_dir, 'chapters'), storage)
+
+    @staticmethod
+    def load_split_manifest(output_dir):
+        """读取最近一次分割的清单（含新增/变化章节列表），不存在时返回 None"""
+        return load_manifest(os.path.join(output_dir, 'chapters'))
 
     @staticmethod
     def load_summary(summary_path):
         try:
-            with open(summary_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return json_codec.read_json(summary_path)
         except:
             return None
 
     @staticmethod
     def export_summary_excel(output_dir):
-        summary_dir = os.path.join(output_dir, 'stage1_summaries')
-        if not os.path.exists(summary_dir):
-            return None
-        summaries = []
-        for fname in os.listdir(summary_dir):
-            if fname.endswith('.json'):
-                summary_path = os.path.join(summary_dir, fname)
-                data = FileProcessor.load_summary(summary_path)
-                if data:
-                    data['chapter_file'] = f"ch_{data['chapter']:03d}.txt"
-                    summaries.append(data)
+        summaries = SummaryStore.for_output_dir(output_dir).load_all()
+        for data in summaries:
+            data['chapter_file'] = f"ch_{data['chapter']:03d}.txt"
         if not summaries:
             return None
         df = pd.DataFrame(summaries)
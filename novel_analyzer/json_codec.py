@@ -0,0 +1,108 @@
+import json
+import math
+import logging
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# 产物读写统一走这里：有 orjson 时用它（C实现，直接产出UTF-8字节），否则退回标准库。
+# 两种后端的输出除以下几点外逐字节一致（紧凑模式都是 ',' ':' 分隔，缩进模式都等同
+# json.dumps(indent=2)，都不转义非ASCII字符，整数键都转成字符串）：
+# - 指数形式的浮点数写法不同（orjson 1e-7 / 1e20，标准库 1e-07 / 1e+20），数值相同；
+# - 含 NaN/Infinity 时整体交给标准库，写出非标准的 NaN/Infinity（orjson 会写成 null），
+#   loads 对这类输入同样回退到标准库解析；
+# - numpy 标量与数组只有 orjson 能序列化。
+# 即便如此，序列化结果需要逐字节稳定的场合（构建指纹、响应缓存键、发给API的提示词）仍直接使用标准库。
+_backend = 'orjson' if orjson is not None else 'json'
+_pretty = False
+
+
+def backend():
+    return _backend
+
+
+def set_backend(name):
+    """切换后端（'orjson' 或 'json'），orjson 不可用时保持标准库"""
+    global _backend
+    if name == 'orjson' and orjson is None:
+        logger.warning("未安装 orjson，继续使用标准库 json")
+        name = 'json'
+    elif name not in ('orjson', 'json'):
+        raise ValueError(f"未知的JSON后端: {name}")
+    _backend = name
+
+
+def set_pretty(pretty):
+    """设置产物文件默认是否缩进输出"""
+    global _pretty
+    _pretty = bool(pretty)
+
+
+def dumps_bytes(obj, pretty=None):
+    """序列化为UTF-8字节；pretty 为 None 时使用全局设置"""
+    if pretty is None:
+        pretty = _pretty
+    if _backend == 'orjson':
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        try:
+            data = orjson.dumps(obj, option=option)
+        except TypeError:
+            # 超出64位的整数等 orjson 不支持的值，交给标准库
+            data = None
+        # orjson 会把 NaN/Infinity 静默写成 null，出现 null 时才检查是否有非有限浮点数
+        if data is not None and (b'null' not in data or not _has_non_finite(obj)):
+            return data
+    if pretty:
+        text = json.dumps(obj, ensure_ascii=False, indent=2)
+    else:
+        text = json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+    return text.encode('utf-8')
+
+
+def _has_non_finite(obj):
+    pending = [obj]
+    while pending:
+        value = pending.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                return True
+        elif isinstance(value, dict):
+            pending.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            pending.extend(value)
+    return False
+
+
+def dumps(obj, pretty=None):
+    return dumps_bytes(obj, pretty).decode('utf-8')
+
+
+def loads(data):
+    """解析字符串或字节，orjson 拒绝的输入（如 NaN）再交给标准库"""
+    if _backend == 'orjson':
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode('utf-8-sig')
+    return json.loads(data)
+
+
+def read_json(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data.startswith(b'\xef\xbb\xbf'):
+        data = data[3:]
+    return loads(data)
+
+
+def write_json(path, obj, pretty=None):
+    with open(path, 'wb') as f:
+        f.write(dumps_bytes(obj, pretty))
@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """基于SQLite的API响应缓存，键为 (引擎, 模型, 温度, 最大token, 提示词) 的哈希"""
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, db_path, max_size_mb=512, max_age_days=30):
+        self.db_path = db_path
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.max_age = max_age_days * 86400
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._writes_since_evict = 0
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses(accessed_at)")
+        self.conn.commit()
+        self.evict()
+
+    @classmethod
+    def for_config(cls, config_manager):
+        """按输出目录返回共享缓存实例，缓存关闭时返回 None"""
+        if config_manager.get('global', 'response_cache', 'true') != 'true':
+            return None
+        output_dir = config_manager.get('global', 'output_dir', 'output')
+        db_path = os.path.abspath(os.path.join(output_dir, 'api_cache.sqlite'))
+        with cls._instances_lock:
+            cache = cls._instances.get(db_path)
+            if cache is None:
+                cache = cls(
+                    db_path,
+                    max_size_mb=float(config_manager.get('global', 'cache_max_mb', '512')),
+                    max_age_days=float(config_manager.get('global', 'cache_max_age_days', '30'))
+                )
+                cls._instances[db_path] = cache
+            return cache
+
+    @staticmethod
+    def make_key(engine, model, temperature, max_tokens, prompt):
+        raw = json.dumps([engine, model, temperature, max_tokens, prompt], ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            now = time.time()
+            if row is None or now - row[1] > self.max_age:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response):
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now)
+            )
+            self.conn.commit()
+            self._writes_since_evict += 1
+            need_evict = self._writes_since_evict >= 100
+        if need_evict:
+            self.evict()
+
+    def evict(self):
+        """先按时间淘汰过期条目，再按最近访问时间淘汰直到总大小低于上限"""
+        with self.lock:
+            self._writes_since_evict = 0
+            expired = self.conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (time.time() - self.max_age,)
+            ).rowcount
+            total_size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            evicted = 0
+            if total_size > self.max_size:
+                excess = total_size - self.max_size
+                for key, size in self.conn.execute(
+                        "SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+                    if excess <= 0:
+                        break
+                    self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    excess -= size
+                    evicted += 1
+            self.conn.commit()
+        if expired or evicted:
+            logger.info(f"响应缓存淘汰: 过期 {expired} 条, 超限 {evicted} 条")
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self.lock:
+            count, total_size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': count,
+            'size_mb': round(total_size / 1024 / 1024, 2)
+        }
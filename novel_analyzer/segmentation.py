@@ -0,0 +1,131 @@
+import bisect
+import numpy as np
+
+
+def _as_matrix(signal):
+    values = np.asarray(signal, dtype=float)
+    if values.ndim == 1:
+        values = values[:, None]
+    return values
+
+
+def noise_variance(signal):
+    """用一阶差分的中位绝对偏差估计噪声方差，不受均值跳变影响；退化时用整体方差"""
+    values = _as_matrix(signal)
+    if len(values) < 3:
+        return 1.0
+    diffs = np.abs(np.diff(values, axis=0))
+    sigma = np.median(diffs, axis=0) / (0.6745 * np.sqrt(2))
+    variance = float(np.sum(sigma ** 2))
+    if variance <= 0:
+        variance = float(np.sum(np.var(values, axis=0)))
+    return variance if variance > 0 else 1.0
+
+
+def binary_segmentation(signal, penalty, min_size=1):
+    """二分变点检测（均值跳变，L2 代价），返回各段的结束下标（不含），最后一个为 len(signal)
+
+    每次在当前区间内找使代价下降最多的切点，下降量超过 penalty 才切分并递归两侧。
+    区间内全部切点的代价下降由前缀和一次向量化求出，每次切分都要重新扫描被切的区间：
+    切分大致均衡时总复杂度 O(n log n)，每次都只切下很短一段时最坏为 O(n²)；
+    signal 可以是一维序列或 (n, d) 特征矩阵。
+    """
+    values = _as_matrix(signal)
+    n = len(values)
+    if n == 0:
+        return []
+    min_size = max(1, int(min_size))
+    cum = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)])
+
+    ends = [n]
+    pending = [(0, n)]
+    while pending:
+        start, end = pending.pop()
+        if end - start < 2 * min_size:
+            continue
+        splits = np.arange(start + min_size, end - min_size + 1)
+        left = cum[splits] - cum[start]
+        right = cum[end] - cum[splits]
+        total = cum[end] - cum[start]
+        # 切分前后平方误差之差 = Σ|左和|²/左长 + Σ|右和|²/右长 − Σ|总和|²/总长
+        gains = (np.sum(left * left, axis=1) / (splits - start)
+                 + np.sum(right * right, axis=1) / (end - splits)
+                 - np.sum(total * total) / (end - start))
+        index = int(np.argmax(gains))
+        if gains[index] <= penalty:
+            continue
+        split = int(splits[index])
+        ends.append(split)
+        pending.append((start, split))
+        pending.append((split, end))
+    return sorted(ends)
+
+
+def segment(signal, scale=1.0, min_size=1):
+    """按 BIC 型惩罚 scale·σ²·ln(n) 做变点分段，返回连续的 (起, 止) 区间列表"""
+    n = len(signal)
+    if n == 0:
+        return []
+    penalty = scale * noise_variance(signal) * np.log(max(n, 2))
+    ends = binary_segmentation(signal, penalty, min_size)
+    starts = [0] + ends[:-1]
+    return list(zip(starts, ends))
+
+
+def block_starts(scores, segment_starts, cut_score=4, max_size=25, low_score=1, max_low=5, turning_score=3):
+    """在分段结果上按分块规则合并，返回 (块起点下标数组, 首块是否缺少转折章节)
+
+    合并只是删除块起点，每条规则都是对起点数组的一次 reduceat 与掩码运算：
+    1. 含转折分≥cut_score 的段或长度≥max_size 的段另起新块，其余段并入前一块；
+    2. 除首块外，转折分≤low_score 的章节达到 max_low 章的块并入前一块；
+    3. 除首块外，不含转折分≥turning_score 章节的块并入前一块。
+    """
+    scores = np.asarray(scores, dtype=float)
+    n = len(scores)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), False
+    segment_starts = np.asarray(segment_starts, dtype=np.int64)
+
+    # 规则1: 核心切割点
+    sizes = np.diff(np.append(segment_starts, n))
+    cut = (np.maximum.reduceat(scores, segment_starts) >= cut_score) | (sizes >= max_size)
+    cut[0] = True
+    starts = segment_starts[cut]
+
+    # 规则2: 低分章节过多的块并入前块
+    low = np.add.reduceat((scores <= low_score).astype(np.int64), starts) >= max_low
+    low[0] = False
+    starts = starts[~low]
+
+    # 规则3: 缺少转折章节的块并入前块
+    has_turning = np.logical_or.reduceat(scores >= turning_score, starts)
+    keep = has_turning.copy()
+    keep[0] = True
+    return starts[keep], not bool(has_turning[0])
+
+
+def shift_peaks(shift, cutoff=0.5, radius=1):
+    """主题差异曲线上的局部峰：在前后 radius 章内最大，且高于 均值 + cutoff·标准差"""
+    shift = np.asarray(shift, dtype=float)
+    n = len(shift)
+    if n < 3:
+        return np.zeros(0, dtype=np.int64)
+    radius = max(1, int(radius))
+    padded = np.pad(shift, radius, constant_values=-np.inf)
+    local_max = np.lib.stride_tricks.sliding_window_view(padded, 2 * radius + 1).max(axis=1)
+    threshold = shift[1:].mean() + cutoff * shift[1:].std()
+    peaks = np.flatnonzero((shift >= local_max) & (shift > threshold))
+    return peaks[peaks > 0]
+
+
+def merge_starts(primary, secondary, count, min_size=1):
+    """合并两组段起点：primary 全部保留，secondary 中与已有起点或末尾相距不足 min_size 的丢弃"""
+    kept = sorted({0} | {int(start) for start in primary})
+    for start in sorted(int(start) for start in secondary):
+        position = bisect.bisect_left(kept, start)
+        if position < len(kept) and kept[position] == start:
+            continue
+        following = kept[position] if position < len(kept) else count
+        if start - kept[position - 1] >= min_size and following - start >= min_size:
+            kept.insert(position, start)
+    return kept
@@ -0,0 +1,170 @@
+import os
+import re
+import json_codec
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_FILE_PATTERN = re.compile(r'summary_(\d+)\.json$')
+
+
+class SummaryStore:
+    """阶段一章节摘要的SQLite存储（WAL），按章节号建索引，支持区间查询与批量读写
+
+    每行保存完整的摘要JSON，同时单独存放 summary/entities/turning_score 以便按列读取。
+    同一进程内共享一个实例并用锁串行写入，多个进程之间依赖WAL与busy_timeout。
+    """
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "chapter INTEGER PRIMARY KEY, summary TEXT NOT NULL, entities TEXT NOT NULL, "
+            "turning_score REAL, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.commit()
+
+    @classmethod
+    def for_output_dir(cls, output_dir):
+        """按输出目录返回共享实例，首次打开时一次性导入已有的 summary_NNN.json"""
+        summary_dir = os.path.join(output_dir, 'stage1_summaries')
+        db_path = os.path.abspath(os.path.join(summary_dir, 'summaries.sqlite'))
+        with cls._instances_lock:
+            store = cls._instances.get(db_path)
+            if store is None:
+                store = cls(db_path)
+                if store.get_meta('json_imported') is None:
+                    imported = store.import_json_dir(summary_dir)
+                    store.set_meta('json_imported', str(imported))
+                cls._instances[db_path] = store
+            return store
+
+    @staticmethod
+    def _row(chapter, result, now):
+        data = dict(result)
+        data['chapter'] = chapter
+        return (
+            chapter,
+            json_codec.dumps(data.get('summary', []), pretty=False),
+            json_codec.dumps(data.get('entities', {}), pretty=False),
+            data.get('turning_score'),
+            json_codec.dumps(data, pretty=False),
+            now
+        )
+
+    def put(self, chapter, result):
+        self.put_many([(chapter, result)])
+
+    def put_many(self, items):
+        """批量写入 (章节号, 摘要) 并在一个事务内提交"""
+        now = time.time()
+        rows = [self._row(chapter, result, now) for chapter, result in items]
+        with self.lock:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO summaries (chapter, summary, entities, turning_score, data, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+
+    def get(self, chapter):
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM summaries WHERE chapter = ?", (chapter,)).fetchone()
+        return json_codec.loads(row[0]) if row else None
+
+    def has(self, chapter):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT 1 FROM summaries WHERE chapter = ?", (chapter,)
+            ).fetchone() is not None
+
+    def chapters(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT chapter FROM summaries ORDER BY chapter")]
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+
+    def load_range(self, start=None, end=None):
+        """按章节号升序返回 [start, end] 区间内的完整摘要，端点为 None 表示不限"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT data FROM summaries WHERE chapter >= ? AND chapter <= ? ORDER BY chapter",
+                (start if start is not None else -(1 << 62), end if end is not None else 1 << 62)
+            ).fetchall()
+        return [json_codec.loads(row[0]) for row in rows]
+
+    def load_all(self):
+        return self.load_range()
+
+    def load_many(self, chapters):
+        """按给定顺序返回存在的章节摘要，一次区间查询完成"""
+        chapters = list(chapters)
+        if not chapters:
+            return []
+        by_chapter = {s['chapter']: s for s in self.load_range(min(chapters), max(chapters))}
+        return [by_chapter[ch] for ch in chapters if ch in by_chapter]
+
+    def delete(self, chapters):
+        """删除指定章节的摘要，返回实际删除的条数"""
+        with self.lock:
+            with self.conn:
+                return self.conn.executemany(
+                    "DELETE FROM summaries WHERE chapter = ?", [(ch,) for ch in chapters]
+                ).rowcount
+
+    def clear(self):
+        with self.lock:
+            with self.conn:
+                self.conn.execute("DELETE FROM summaries")
+
+    def get_meta(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self.lock:
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def import_json_dir(self, summary_dir, overwrite=False):
+        """导入目录中的 summary_NNN.json，默认不覆盖库中已有章节，返回导入条数"""
+        if not os.path.isdir(summary_dir):
+            return 0
+        existing = set() if overwrite else set(self.chapters())
+        items = []
+        with os.scandir(summary_dir) as entries:
+            for entry in entries:
+                match = SUMMARY_FILE_PATTERN.match(entry.name)
+                if not match:
+                    continue
+                chapter = int(match.group(1))
+                if chapter in existing:
+                    continue
+                try:
+                    items.append((chapter, json_codec.read_json(entry.path)))
+                except (OSError, ValueError) as e:
+                    logger.warning(f"跳过无法解析的摘要文件 {entry.name}: {str(e)}")
+        if items:
+            self.put_many(items)
+            logger.info(f"已从 {summary_dir} 导入 {len(items)} 个章节摘要")
+        return len(items)
+
+    def close(self):
+        with self._instances_lock:
+            self._instances.pop(os.path.abspath(self.db_path), None)
+        with self.lock:
+            self.conn.close()
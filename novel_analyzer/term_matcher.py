@@ -0,0 +1,65 @@
+from collections import deque
+
+
+class TermMatcher:
+    """Aho-Corasick 多模式匹配：一次扫描文本找出出现过的全部术语，耗时与术语数量无关"""
+
+    def __init__(self, terms):
+        self.terms = [term for term in dict.fromkeys(terms) if term]
+        self.goto = [{}]
+        self.fail = [0]
+        self.match = [-1]  # 以该状态结尾的术语下标
+        self.link = [0]    # 沿失败链最近的一个有输出的状态，0 表示没有
+
+        for index, term in enumerate(self.terms):
+            state = 0
+            for char in term:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.match.append(-1)
+                    self.link.append(0)
+                state = next_state
+            self.match[state] = index
+
+        # 广度优先构建失败指针
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[child] = target if target != child else 0
+                self.link[child] = target if self.match[target] >= 0 else self.link[target]
+
+    def __len__(self):
+        return len(self.terms)
+
+    def find(self, text):
+        """返回在文本中出现过的术语，按首次匹配结束位置排序"""
+        goto = self.goto
+        fail = self.fail
+        match = self.match
+        link = self.link
+        root = goto[0]
+        found = {}
+        state = 0
+        for char in text:
+            if state == 0 and char not in root:
+                continue
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            output = state if match[state] >= 0 else link[state]
+            while output:
+                index = match[output]
+                if index not in found:
+                    found[index] = None
+                output = link[output]
+        return [self.terms[index] for index in found]
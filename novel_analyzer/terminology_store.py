@@ -0,0 +1,123 @@
+import os
+import json_codec
+import logging
+import threading
+from itertools import islice
+from term_matcher import TermMatcher
+
+logger = logging.getLogger(__name__)
+
+
+class TerminologyStore:
+    """线程安全的术语表：内存中保存全部术语，新增条目追加到日志文件，定期压缩回 terminology.json
+
+    日志每行是一次新增的JSON对象；启动时先读快照再按顺序重放日志，重放是幂等的，
+    压缩过程中崩溃也不会丢失或重复术语。
+    """
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, term_path, compact_every=100):
+        self.term_path = term_path
+        self.journal_path = term_path + '.journal'
+        self.compact_every = compact_every
+        self.lock = threading.RLock()
+        self.terms = {}
+        self.version = 0
+        self._matcher = None
+        self._matcher_version = -1
+        self._journal_entries = 0
+        self._load()
+
+    @classmethod
+    def for_output_dir(cls, output_dir):
+        """按输出目录返回共享实例，同一目录下的所有写入方使用同一份内存术语表"""
+        term_path = os.path.abspath(os.path.join(output_dir, 'terminology.json'))
+        with cls._instances_lock:
+            store = cls._instances.get(term_path)
+            if store is None:
+                store = cls(term_path)
+                cls._instances[term_path] = store
+            return store
+
+    def _load(self):
+        if os.path.exists(self.term_path):
+            try:
+                self.terms = json_codec.read_json(self.term_path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"术语表读取失败，按空表处理: {str(e)}")
+                self.terms = {}
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    self.terms.update(json_codec.loads(line))
+                except ValueError:
+                    # 上次写入中断留下的残行，之后的条目也不可信
+                    logger.warning("术语日志末尾存在不完整的记录，已忽略")
+                    break
+                self._journal_entries += 1
+        if self._journal_entries:
+            self.compact()
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.terms)
+
+    def __contains__(self, name):
+        return name in self.terms
+
+    def __len__(self):
+        return len(self.terms)
+
+    def get_many(self, names):
+        with self.lock:
+            return {name: self.terms[name] for name in names if name in self.terms}
+
+    def matcher(self):
+        """返回覆盖当前全部术语的匹配器，术语表变化后才重建"""
+        with self.lock:
+            if self._matcher_version != self.version:
+                self._matcher = TermMatcher(list(self.terms))
+                self._matcher_version = self.version
+            return self._matcher
+
+    def find_in(self, text):
+        """找出文本中出现的术语名"""
+        return self.matcher().find(text)
+
+    def earliest(self, count):
+        """按登记顺序返回最早的 count 个术语，通常是最先出场的主要人物和设定；
+        只取决于已持久化的术语表，同一章节多次运行得到相同的提示词"""
+        with self.lock:
+            return list(islice(self.terms, max(0, count)))
+
+    def add(self, new_terms, overwrite=False):
+        """新增术语并追加到日志，返回实际写入的条目；默认不覆盖已有术语"""
+        with self.lock:
+            if overwrite:
+                added = {name: value for name, value in new_terms.items() if self.terms.get(name) != value}
+            else:
+                added = {name: value for name, value in new_terms.items() if name not in self.terms}
+            if not added:
+                return added
+            self.terms.update(added)
+            self.version += 1
+            os.makedirs(os.path.dirname(self.journal_path) or '.', exist_ok=True)
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(json_codec.dumps(added, pretty=False) + '\n')
+            self._journal_entries += 1
+            if self._journal_entries >= self.compact_every:
+                self.compact()
+            return added
+
+    def compact(self):
+        """把内存术语表写回 terminology.json 并清空日志"""
+        with self.lock:
+            os.makedirs(os.path.dirname(self.term_path) or '.', exist_ok=True)
+            json_codec.write_json(self.term_path + '.tmp', self.terms)
+            os.replace(self.term_path + '.tmp', self.term_path)
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self._journal_entries = 0
@@ -0,0 +1,66 @@
+import re
+import math
+
+# 各引擎可选模型及上下文窗口（token），按窗口从小到大排列
+CONTEXT_WINDOWS = {
+    'DeepSeek': [('deepseek-chat', 65536)],
+    'Kimi': [('moonshot-v1-8k', 8192), ('moonshot-v1-32k', 32768), ('moonshot-v1-128k', 131072)]
+}
+
+# 消息封装等固定开销
+MESSAGE_OVERHEAD = 64
+
+CJK_PATTERN = re.compile(r'[\u2e80-\u9fff\uf900-\ufaff\uff00-\uffef]')
+
+
+class PromptTooLongError(ValueError):
+    """提示词超出所有可用模型的上下文窗口"""
+
+    def __init__(self, prompt_tokens, limit):
+        super().__init__(f"提示词约 {prompt_tokens} token，超出可用上限 {limit} token")
+        self.prompt_tokens = prompt_tokens
+        self.limit = limit
+
+
+def estimate_tokens(text):
+    """本地估算token数：中日韩字符按每字1个，其余按每3个字符1个（均偏保守）"""
+    if not text:
+        return 0
+    cjk_count = len(CJK_PATTERN.findall(text))
+    return cjk_count + math.ceil((len(text) - cjk_count) / 3)
+
+
+def get_context_window(engine, model):
+    for name, window in CONTEXT_WINDOWS.get(engine, []):
+        if name == model:
+            return window
+    return None
+
+
+def max_prompt_tokens(engine, max_tokens, model=None):
+    """提示词可用的最大token数；指定模型时按该模型计算，否则按最大窗口计算"""
+    if model:
+        window = get_context_window(engine, model)
+    else:
+        windows = CONTEXT_WINDOWS.get(engine, [])
+        window = windows[-1][1] if windows else None
+    if window is None:
+        return None
+    return window - max_tokens - MESSAGE_OVERHEAD
+
+
+def select_model(engine, prompt_tokens, max_tokens):
+    """选择能容纳提示词与输出的最小模型，均不足时抛出 PromptTooLongError"""
+    needed = prompt_tokens + max_tokens + MESSAGE_OVERHEAD
+    windows = CONTEXT_WINDOWS.get(engine, [])
+    for name, window in windows:
+        if needed <= window:
+            return name
+    raise PromptTooLongError(prompt_tokens, max_prompt_tokens(engine, max_tokens) or 0)
+
+
+def check_fits(engine, model, prompt_tokens, max_tokens):
+    """固定模型时校验提示词长度，未知模型不做限制"""
+    limit = max_prompt_tokens(engine, max_tokens, model)
+    if limit is not None and prompt_tokens > limit:
+        raise PromptTooLongError(prompt_tokens, limit)
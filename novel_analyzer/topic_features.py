@@ -0,0 +1,109 @@
+import numpy as np
+
+# 字符 n-gram 哈希到固定维度的稀疏 TF-IDF 向量，不需要词表，也不需要分词
+N_FEATURES = 1 << 18
+NGRAM_RANGE = (2, 3)
+_SEPARATOR = 0
+_BASE = np.uint64(1000003)
+
+
+def chapter_text(summary):
+    """取章节摘要中用于主题比较的文本：事件摘要加新出场人物/设定名"""
+    events = summary.get('summary') or []
+    if isinstance(events, str):
+        events = [events]
+    parts = [str(event) for event in events]
+    entities = summary.get('entities') or {}
+    if isinstance(entities, dict):
+        for names in entities.values():
+            if isinstance(names, list):
+                parts.extend(str(name).split('@', 1)[0] for name in names)
+    # 去掉文本中的分隔符，保证 n-gram 不跨章
+    return ' '.join(parts).replace('\x00', ' ')
+
+
+def hashed_tfidf(texts, ngram_range=NGRAM_RANGE, n_features=N_FEATURES):
+    """构建 L2 归一化的 TF-IDF 稀疏矩阵，以 COO 数组 (行, 列, 权重) 返回，按 (行, 列) 排序
+
+    所有文本拼成一个码点数组，n-gram 哈希、计数与 IDF 都是整体的数组运算。
+    """
+    count = len(texts)
+    empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0))
+    if count == 0:
+        return empty
+    corpus = '\x00'.join(texts) + '\x00'
+    codes = np.frombuffer(corpus.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    is_sep = codes == _SEPARATOR
+    doc_of = np.cumsum(is_sep) - is_sep  # 分隔符归属其前一章
+    sep_prefix = np.concatenate([[0], np.cumsum(is_sep)])
+
+    keys = []
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        positions = len(codes) - n + 1
+        if positions <= 0:
+            continue
+        valid = sep_prefix[n:n + positions] == sep_prefix[:positions]
+        hashes = np.full(positions, np.uint64(n), dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            for offset in range(n):
+                hashes = hashes * _BASE + codes[offset:offset + positions]
+        terms = (hashes % np.uint64(n_features)).astype(np.int64)
+        keys.append(doc_of[:positions][valid].astype(np.int64) * n_features + terms[valid])
+    if not keys:
+        return empty
+
+    keys, counts = np.unique(np.concatenate(keys), return_counts=True)
+    rows = keys // n_features
+    cols = keys % n_features
+    document_freq = np.bincount(cols, minlength=n_features)
+    idf = np.log((1.0 + count) / (1.0 + document_freq)) + 1.0
+    weights = (1.0 + np.log(counts)) * idf[cols]
+    norms = np.sqrt(np.bincount(rows, weights * weights, minlength=count))
+    weights /= norms[rows]
+    return rows, cols, weights
+
+
+def lagged_dots(rows, cols, weights, count, max_lag, n_features=N_FEATURES):
+    """返回 dots[k][i] = v_i · v_{i+k}（k = 0..max_lag），在排序键上二分查找同列元素"""
+    keys = rows * n_features + cols
+    dots = []
+    for lag in range(max_lag + 1):
+        target = keys + lag * n_features
+        index = np.searchsorted(keys, target)
+        index[index >= len(keys)] = 0
+        match = keys[index] == target
+        dots.append(np.bincount(rows[match], weights[match] * weights[index[match]], minlength=count))
+    return dots
+
+
+def topic_shift(summaries, window=3):
+    """相邻窗口主题差异：shift[p] 为第 p 章之前 window 章与之后 window 章的 TF-IDF 余弦距离
+
+    窗口向量是章节向量之和，其内积由相隔 0..2·window−1 章的章节内积组合而成，
+    全程只做与章节数成线性的数组运算。shift[0] 恒为 0。
+    """
+    count = len(summaries)
+    shift = np.zeros(count)
+    if count < 2:
+        return shift
+    window = max(1, int(window))
+    rows, cols, weights = hashed_tfidf([chapter_text(s) for s in summaries])
+    dots = lagged_dots(rows, cols, weights, count, 2 * window - 1)
+    # 两端各补 window 个空章节，窗口越界部分自然为零向量
+    padded = [np.concatenate([np.zeros(window), dot, np.zeros(window)]) for dot in dots]
+
+    bounds = np.arange(1, count) + window
+    cross = np.zeros(count - 1)
+    left = np.zeros(count - 1)
+    right = np.zeros(count - 1)
+    for i in range(window):
+        for j in range(window):
+            cross += padded[window - i + j][bounds - window + i]
+            if j >= i:
+                factor = 1.0 if i == j else 2.0
+                left += factor * padded[j - i][bounds - window + i]
+                right += factor * padded[j - i][bounds + i]
+    denominator = np.sqrt(left * right)
+    similarity = np.divide(cross, denominator, out=np.ones(count - 1), where=denominator > 0)
+    shift[1:] = 1.0 - np.clip(similarity, 0.0, 1.0)
+    return shift
@@ -4,6 +4,7 @@ from tkinter import ttk
 import logging
 import threading
 from config_manager import ConfigManager
+from api_registry import APIClientRegistry
 from components.file_settings import FileSettings
 from components.api_settings import APISettings
 from components.progress_log import ProgressLog
@@ -123,11 +124,15 @@ class NovelAnalyzerApp(tk.Tk):
         self.update_idletasks()
         self.minsize(1400, 1000)
 
+        self.refresh_headroom()
+
     def save_global_settings(self):
         """保存全局设置"""
         self.file_settings.save_settings()
         self.api_settings.save_settings()
         self.config_manager.save_config()
+        # 共享客户端的连接池大小和超时在创建时确定，保存后按新设置重建
+        APIClientRegistry.reload_settings()
         self.save_status.config(text="✓ 全局设置已保存")
 
         # 初始化输出目录
@@ -214,6 +219,15 @@ class NovelAnalyzerApp(tk.Tk):
             self.progress_log.log("正在停止任务...", "warning")
             self.stop_btn.config(state=tk.DISABLED)
 
+    def refresh_headroom(self):
+        """定时刷新API配额余量，只显示已创建的客户端，不为正在输入的密钥新建客户端"""
+        try:
+            client = APIClientRegistry.peek(self.config_manager)
+            self.progress_log.update_headroom(client.get_headroom() if client is not None else None)
+        except Exception as e:
+            logging.debug(f"获取API余量失败: {str(e)}")
+        self.after(1000, self.refresh_headroom)
+
     def log(self, message, level="info"):
         """添加日志"""
         self.progress_log.log(message, level)
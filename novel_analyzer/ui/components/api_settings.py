@@ -1,6 +1,6 @@
 # ui/components/api_settings.py
 import tkinter as tk
-from tkinter import ttk
+from tkinter import ttk, scrolledtext
 import logging
 from config_manager import ConfigManager
 
@@ -16,6 +16,8 @@ class APISettings(ttk.LabelFrame):
         self.grid_rowconfigure(0, weight=1)
         self.grid_rowconfigure(1, weight=1)
         self.grid_rowconfigure(2, weight=1)
+        self.grid_rowconfigure(3, weight=1)
+        self.grid_rowconfigure(4, weight=1)
         self.grid_columnconfigure(0, weight=1)
         self.grid_columnconfigure(1, weight=3)
         self.grid_columnconfigure(2, weight=1)
@@ -74,6 +76,41 @@ class APISettings(ttk.LabelFrame):
         ttk.Label(self, text="(免费版有限速)", font=("Arial", 9), foreground="gray").grid(
             row=2, column=2, padx=5, sticky=tk.W)
 
+        # 并发请求数
+        ttk.Label(self, text="并发请求数:", font=("Arial", 10)).grid(
+            row=3, column=0, padx=10, pady=10, sticky=tk.W)
+        self.concurrency_var = tk.StringVar(value=self.config.get('global', 'concurrency', '4'))
+        ttk.Spinbox(
+            self,
+            from_=1,
+            to=32,
+            textvariable=self.concurrency_var,
+            width=13,
+            font=("Arial", 10)
+        ).grid(row=3, column=1, padx=10, pady=10, sticky=tk.W)
+
+        ttk.Label(self, text="(同时进行的API请求数)", font=("Arial", 9), foreground="gray").grid(
+            row=3, column=2, padx=5, sticky=tk.W)
+
+        # 响应缓存开关
+        self.cache_var = tk.BooleanVar(value=self.config.get('global', 'response_cache', 'true') == 'true')
+        ttk.Checkbutton(
+            self,
+            text="响应缓存",
+            variable=self.cache_var,
+            width=10
+        ).grid(row=3, column=3, padx=10, sticky=tk.W)
+
+        # 密钥池（多引擎/多密钥负载均衡）
+        ttk.Label(self, text="密钥池:", font=("Arial", 10)).grid(
+            row=4, column=0, padx=10, pady=10, sticky=tk.NW)
+        self.backends_text = scrolledtext.ScrolledText(self, wrap=tk.NONE, height=3, width=60,
+                                                       font=("Arial", 10))
+        self.backends_text.grid(row=4, column=1, padx=10, pady=10, sticky=tk.W + tk.E)
+        self.backends_text.insert(tk.END, self.config.get('global', 'api_backends', ''))
+        ttk.Label(self, text="(每行: 引擎|密钥|模型|权重)", font=("Arial", 9), foreground="gray").grid(
+            row=4, column=2, columnspan=2, padx=5, sticky=tk.NW)
+
         # 初始化密钥状态
         self._update_key_status()
 
@@ -99,4 +136,7 @@ class APISettings(ttk.LabelFrame):
         self.config.set('global', 'api_engine', self.engine_var.get())
         self.config.set('global', 'api_key', self.api_key_var.get())
         self.config.set('global', 'api_plan', self.plan_var.get())
+        self.config.set('global', 'concurrency', self.concurrency_var.get())
+        self.config.set('global', 'response_cache', 'true' if self.cache_var.get() else 'false')
+        self.config.set('global', 'api_backends', self.backends_text.get("1.0", tk.END).strip())
         self._update_key_status()
\ No newline at end of file
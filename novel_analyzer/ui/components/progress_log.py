@@ -48,6 +48,16 @@ class ProgressLog(ttk.LabelFrame):
         )
         status_label.pack(fill=tk.X, padx=15, pady=5)
 
+        # API配额余量
+        self.headroom_var = tk.StringVar(value="")
+        ttk.Label(
+            self,
+            textvariable=self.headroom_var,
+            font=("Arial", 9),
+            foreground="gray",
+            anchor=tk.CENTER
+        ).pack(fill=tk.X, padx=15)
+
         # 日志区域
         log_frame = ttk.Frame(self)
         log_frame.pack(fill=tk.BOTH, expand=True, padx=15, pady=15)
@@ -141,6 +151,17 @@ class ProgressLog(ttk.LabelFrame):
         self.status_var.set(message)
         self.update_idletasks()
 
+    def update_headroom(self, headroom):
+        """显示限流器剩余配额，headroom 为 None 时清空"""
+        if headroom is None:
+            self.headroom_var.set("")
+            return
+        text = (f"API余量: {headroom['requests_available']:.1f}/{headroom['request_capacity']} 次 "
+                f"({headroom['fill']:.0%}), {headroom['rpm']} RPM")
+        if headroom['tokens_available'] is not None:
+            text += f", token {headroom['tokens_available']:.0f}/{headroom['tpm']} TPM"
+        self.headroom_var.set(text)
+
     def reset(self):
         """重置进度和状态"""
         self.progress_var.set(0)
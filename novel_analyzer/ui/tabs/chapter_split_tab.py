@@ -54,6 +54,28 @@ class ChapterSplitTab(BaseTab):
         detect_btn.grid(row=1, column=2, padx=10)
         self.register_button(detect_btn)
 
+        # 章节存储格式：files 为每章一个文件，packed 为单一数据文件加偏移索引
+        ttk.Label(config_frame, text="存储格式:", font=("Arial", 10)).grid(
+            row=2, column=0, padx=10, pady=10, sticky=tk.W)
+        self.storage_var = tk.StringVar(value=self.config.get('chapter_split', 'storage', 'files'))
+        storage_combo = ttk.Combobox(
+            config_frame,
+            textvariable=self.storage_var,
+            values=['files', 'packed'],
+            state="readonly",
+            width=15
+        )
+        storage_combo.grid(row=2, column=1, padx=10, pady=10, sticky=tk.W)
+
+        # 增量分割：只重新分割源文件中变化或追加的章节
+        self.incremental_var = tk.BooleanVar(
+            value=self.config.get('chapter_split', 'incremental', 'true') == 'true')
+        ttk.Checkbutton(
+            config_frame,
+            text="增量分割",
+            variable=self.incremental_var
+        ).grid(row=2, column=2, padx=10, sticky=tk.W)
+
         # 保存配置按钮
         save_btn = ttk.Button(
             config_frame,
@@ -101,6 +123,8 @@ class ChapterSplitTab(BaseTab):
         """保存配置"""
         self.config.set('chapter_split', 'regex', self.regex_var.get())
         self.config.set('chapter_split', 'encoding', self.encoding_var.get())
+        self.config.set('chapter_split', 'storage', self.storage_var.get())
+        self.config.set('chapter_split', 'incremental', 'true' if self.incremental_var.get() else 'false')
         self.config.save_config()
         self.log("分割配置已保存")
 
@@ -136,7 +160,7 @@ class ChapterSplitTab(BaseTab):
         if os.path.exists(chapter_dir):
             # 删除所有章节文件
             for f in os.listdir(chapter_dir):
-                if f.endswith('.txt'):
+                if f.endswith('.txt') or f in ('chapters.dat', 'chapters.idx', 'manifest.json'):
                     os.remove(os.path.join(chapter_dir, f))
             self.log(f"已清除章节文件: {chapter_dir}")
         else:
@@ -149,9 +173,10 @@ class ChapterSplitTab(BaseTab):
             self.log("请先选择有效的小说文件", level="error")
             return
 
-        from file_processor import FileProcessor
+        from encoding_resolver import EncodingResolver
+        output_dir = self.config.get('global', 'output_dir', 'output')
         try:
-            encoding = FileProcessor.advanced_detect_encoding(novel_path)
+            encoding = EncodingResolver(os.path.join(output_dir, 'encoding_cache.json')).detect(novel_path)
             self.encoding_var.set(encoding)
             self.log(f"检测建议编码: {encoding}")
         except Exception as e:
@@ -4,6 +4,7 @@ from tkinter import ttk, scrolledtext, filedialog
 import os
 from .base_tab import BaseTab
 from analyzers.stage1_summary_analyzer import Stage1SummaryAnalyzer
+from summary_store import SummaryStore
 
 
 class Stage1SummaryTab(BaseTab):
@@ -33,9 +34,17 @@ class Stage1SummaryTab(BaseTab):
             variable=self.term_binding_var
         ).grid(row=0, column=3, padx=10)
 
+        # 核心人物：无论章节中是否出现都绑定到提示词
+        ttk.Label(config_frame, text="核心人物:", font=("Arial", 10)).grid(
+            row=1, column=0, padx=10, pady=10, sticky=tk.W)
+        self.core_terms_var = tk.StringVar(value=self.config.get('stage1', 'core_terms', ''))
+        ttk.Entry(config_frame, textvariable=self.core_terms_var, width=30).grid(row=1, column=1, padx=10, pady=10)
+        ttk.Label(config_frame, text="(逗号分隔，其余术语仅在章节中出现时绑定)", font=("Arial", 9)).grid(
+            row=1, column=2, columnspan=2, padx=10, sticky=tk.W)
+
         # 提示词区域
         prompt_frame = ttk.Frame(config_frame)
-        prompt_frame.grid(row=1, column=0, columnspan=4, sticky=tk.W + tk.E, padx=10, pady=10)
+        prompt_frame.grid(row=2, column=0, columnspan=4, sticky=tk.W + tk.E, padx=10, pady=10)
 
         ttk.Label(prompt_frame, text="提示词:", font=("Arial", 10)).pack(side=tk.TOP, anchor=tk.W)
         self.prompt_text = scrolledtext.ScrolledText(prompt_frame, wrap=tk.WORD, height=15, width=100,
@@ -45,7 +54,7 @@ class Stage1SummaryTab(BaseTab):
 
         # 按钮区域
         button_frame = ttk.Frame(config_frame)
-        button_frame.grid(row=2, column=0, columnspan=4, pady=10)
+        button_frame.grid(row=3, column=0, columnspan=4, pady=10)
 
         ttk.Button(
             button_frame,
@@ -91,6 +100,7 @@ class Stage1SummaryTab(BaseTab):
         """保存配置"""
         self.config.set('stage1', 'chapter_range', self.range_var.get())
         self.config.set('stage1', 'term_binding', 'true' if self.term_binding_var.get() else 'false')
+        self.config.set('stage1', 'core_terms', self.core_terms_var.get())
         self.config.set('stage1', 'prompt', self.prompt_text.get("1.0", tk.END).strip())
         self.config.save_config()
         self.log("摘要配置已保存")
@@ -130,7 +140,8 @@ class Stage1SummaryTab(BaseTab):
         summary_dir = os.path.join(output_dir, 'stage1_summaries')
 
         if os.path.exists(summary_dir):
-            # 删除所有摘要文件
+            # 清空摘要库并删除旧版的摘要JSON文件
+            SummaryStore.for_output_dir(output_dir).clear()
             for f in os.listdir(summary_dir):
                 if f.endswith('.json'):
                     os.remove(os.path.join(summary_dir, f))
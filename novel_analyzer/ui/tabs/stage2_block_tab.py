@@ -2,7 +2,7 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext
 import os
-import json
+import json_codec
 import shutil
 from analyzers.stage2_block_analyzer import Stage2BlockAnalyzer
 from .base_tab import BaseTab
@@ -40,6 +40,13 @@ class Stage2BlockTab(BaseTab):
             variable=self.cross_volume_var
         ).grid(row=0, column=2, padx=10)
 
+        # 分窗章节数：章节数超过该值时分窗并行请求
+        window_frame = ttk.Frame(config_frame)
+        window_frame.grid(row=0, column=3, padx=10, sticky=tk.W)
+        ttk.Label(window_frame, text="分窗章节数:", font=("Arial", 10)).pack(side=tk.LEFT)
+        self.window_size_var = tk.StringVar(value=self.config.get('stage2', 'window_size', '200'))
+        ttk.Entry(window_frame, textvariable=self.window_size_var, width=8).pack(side=tk.LEFT, padx=5)
+
         # 提示词区域
         prompt_frame = ttk.Frame(config_frame)
         prompt_frame.grid(row=1, column=0, columnspan=4, sticky=tk.W + tk.E, padx=10, pady=10)
@@ -109,6 +116,7 @@ class Stage2BlockTab(BaseTab):
         """保存配置"""
         self.config.set('stage2', 'block_sensitivity', self.sensitivity_var.get())
         self.config.set('stage2', 'cross_volume', 'true' if self.cross_volume_var.get() else 'false')
+        self.config.set('stage2', 'window_size', self.window_size_var.get().strip() or '200')
         self.config.set('stage2', 'prompt', self.prompt_text.get("1.0", tk.END).strip())
         self.config.save_config()
         self.log("分块配置已保存")
@@ -153,8 +161,7 @@ class Stage2BlockTab(BaseTab):
 
         if os.path.exists(block_path):
             try:
-                with open(block_path, 'r', encoding='utf-8') as f:
-                    block_data = json.load(f)
+                block_data = json_codec.read_json(block_path)
 
                 # 格式化显示结果
                 for i, block in enumerate(block_data['blocks'], 1):
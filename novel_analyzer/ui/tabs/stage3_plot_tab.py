@@ -2,7 +2,7 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext
 import os
-import json
+import json_codec
 from analyzers.stage3_plot_analyzer import Stage3PlotAnalyzer
 from .base_tab import BaseTab
 
@@ -154,8 +154,7 @@ class Stage3PlotTab(BaseTab):
             for plot_file in plot_files:
                 plot_path = os.path.join(plot_dir, plot_file)
                 try:
-                    with open(plot_path, 'r', encoding='utf-8') as f:
-                        plot_data = json.load(f)
+                    plot_data = json_codec.read_json(plot_path)
 
                     block_id = plot_data.get('block_id', '?')
                     self.result_text.insert(tk.END, f"情节块 {block_id}:\n", "title")
@@ -119,18 +119,24 @@ class Stage4OutlineTab(BaseTab):
     def _run_generate_outline(self):
         """实际执行大纲生成"""
         self.log("开始生成全书大纲...")
-        self.output_area.delete(1.0, tk.END)
+        self.after(0, lambda: self.output_area.delete(1.0, tk.END))
+
+        # 流式文本在主线程追加到显示区域
+        self.analyzer.stream_callback = lambda text: self.after(0, self._append_output, text)
 
         try:
             success, result = self.analyzer.run()
             if success:
-                self.output_area.insert(tk.END, result)
                 self.log("全书大纲生成成功")
             else:
                 self.log("大纲生成失败，请检查日志", level="error")
         except Exception as e:
             self.log(f"大纲生成出错: {str(e)}", level="error")
 
+    def _append_output(self, text):
+        self.output_area.insert(tk.END, text)
+        self.output_area.see(tk.END)
+
     def clear_files(self):
         """清除阶段4生成的文件"""
         # 使用基类方法清除文件